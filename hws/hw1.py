@@ -1,6 +1,9 @@
 import streamlit as st
-from openai import OpenAI
-from pypdf import PdfReader
+from utils.document_qa import candidate_sections, combine_answers, map_answers, split_sections
+from utils.documents import document_text
+from utils.resources import get_openai_client
+from utils.tokens import count_tokens
+from utils.tracing import count, show_timings, span, start_trace
 
 st.title("HW 1")
 
@@ -9,7 +12,7 @@ openai_api_key = st.text_input("OpenAI API Key", type="password")
 if not openai_api_key:
     st.info("Please add your OpenAI API key to continue.")
 else:
-    client = OpenAI(api_key=openai_api_key)
+    client = get_openai_client(openai_api_key)
 
     uploaded_file = st.file_uploader(
         "Upload a document (.txt or .pdf)", type=("txt", "pdf")
@@ -20,23 +23,46 @@ else:
         disabled=not uploaded_file,
     )
 
+    large_document_mode = st.checkbox(
+        "Large document mode",
+        help="Read only the sections that look relevant, answer from each in parallel, then combine the answers.",
+    )
+
+    trace = None
     if uploaded_file and question:
+        trace = start_trace("hw1")
 
-        if uploaded_file.type == "application/pdf":
-            reader = PdfReader(uploaded_file)
-            document = "\n".join(page.extract_text() or "" for page in reader.pages)
-        else:
-            document = uploaded_file.read().decode("utf-8")
+        progress_bar = st.empty()
+
+        def show_progress(pages_done, total_pages):
+            progress_bar.progress(pages_done / total_pages, text=f"Reading page {pages_done} of {total_pages}")
 
-        response = client.responses.create(
-            model="gpt-4.1-mini",
-            input=f"Here is a document:\n{document}\n\nQuestion: {question}",
-            stream=True,
+        # Cached by file content, so a second question about the same upload skips parsing.
+        document = document_text(
+            uploaded_file.getvalue(), uploaded_file.type == "application/pdf", progress=show_progress
         )
+        progress_bar.empty()
+
+        if large_document_mode:
+            sections = split_sections(document)
+            candidates = candidate_sections(sections, question)
+            with st.spinner(f"Reading {len(candidates)} of {len(sections)} sections..."), span("llm_map"):
+                partials = map_answers(client, "gpt-4.1-mini", question, candidates)
+            response = combine_answers(client, "gpt-4.1-mini", question, partials)
+        else:
+            count("prompt_tokens", count_tokens(document) + count_tokens(question))
+            response = client.responses.create(
+                model="gpt-4.1-mini",
+                input=f"Here is a document:\n{document}\n\nQuestion: {question}",
+                stream=True,
+            )
 
         def stream_text():
             for event in response:
                 if event.type == "response.output_text.delta":
                     yield event.delta
 
-        st.write_stream(stream_text())
\ No newline at end of file
+        st.write_stream(trace.stream(stream_text()))
+        trace.finish()
+
+    show_timings("hw1", trace)
\ No newline at end of file
@@ -1,9 +1,10 @@
 import streamlit as st
-from openai import OpenAI
-from pypdf import PdfReader
-from bs4 import BeautifulSoup
-import requests
-from anthropic import Anthropic
+from utils.fetch import fetch
+from utils.llm import LLM, Route
+from utils.resources import get_anthropic_client, get_openai_client
+from utils.summary_cache import get_summary_cache, replay, summary_key
+from utils.tokens import count_tokens
+from utils.tracing import count, show_timings, span, start_trace
 
 # Show title and description.
 st.title("HW 2")
@@ -15,27 +16,29 @@ add_LLM_sbox = st.sidebar.selectbox("Which LLM would you like to use?", ["ChatGP
 add_sum_sbox = st.sidebar.selectbox("Which kind of summary would you like to use?", ["in 100 Words", "in 2 Paragraphs", "in 5 Bullet Points"])
 add_lang_sbox = st.sidebar.selectbox("Output language", ["English", "French", "Spanish"])
 add_model_checkbox = st.sidebar.checkbox("Would you like to use the stonger model?", value = False)
+add_hedge_checkbox = st.sidebar.checkbox(
+    "Hedge slow requests", value=False,
+    help="If the first words are slower than usual, also ask the other provider's small model and use whichever answers first."
+)
 
 
 def read_url_content(url):
-    try:
-        response = requests.get(url)
-        response.raise_for_status() # Raise an exception for HTTP errors
-        soup = BeautifulSoup(response.content, 'html.parser')
-        return soup.get_text()
-    except requests.RequestException as e:
-        print(f"Error reading {url}: {e}")
+    result = fetch(url)
+    if not result.ok:
+        print(f"Error reading {url}: {result.error}")
         return None
+    from bs4 import BeautifulSoup
 
-# Ask user for their OpenAI API key via `st.text_input`.
-# Alternatively, you can store the API key in `./.streamlit/secrets.toml` and access it
-# via `st.secrets`, see https://docs.streamlit.io/develop/concepts/connections/secrets-management
-openai_api_key = st.secrets.EddieOpenAPIKey
-claude_api_key = st.secrets.EddieClaudeAPIKey
-
+    with span("parse"):
+        soup = BeautifulSoup(result.content, 'html.parser')
+        return soup.get_text()
 
-anthropic_client = Anthropic(api_key=claude_api_key)
-openAI_client = OpenAI(api_key=openai_api_key)
+# The keys come from `./.streamlit/secrets.toml` via `st.secrets`, see
+# https://docs.streamlit.io/develop/concepts/connections/secrets-management. Called with no
+# arguments like every other page, so all of them (and the startup warm-up) share one client.
+anthropic_client = get_anthropic_client()
+openAI_client = get_openai_client()
+llm = LLM(openAI_client, anthropic_client)
 
 
 # Let the user upload a file via `st.file_uploader`.
@@ -43,40 +46,54 @@ uploaded_link = st.text_input("Enter a URL")
 
 
 
+trace = None
 if uploaded_link:
+    trace = start_trace("hw2")
 
-    document = read_url_content(uploaded_link)
-    prompt = f"Here is a document:\n{document}\n\nSummarize this document {add_sum_sbox}. Respond in {add_lang_sbox}."
+    # Changing the style, language or model reruns the page; keep the fetched text so only
+    # a new URL (or one whose last fetch failed) triggers a new fetch.
+    fetched_url, fetched = st.session_state.get("hw2_page", (None, None))
+    if fetched_url != uploaded_link or fetched is None:
+        st.session_state.hw2_page = (uploaded_link, read_url_content(uploaded_link))
+    document = st.session_state.hw2_page[1]
 
-    if add_LLM_sbox == "ChatGPT":
-        if add_model_checkbox:
-            model_check = "gpt-5-mini"
+    if document is None:
+        st.error(f"Could not read {uploaded_link}. Check the URL and try again.")
+    else:
+        prompt = f"Here is a document:\n{document}\n\nSummarize this document {add_sum_sbox}. Respond in {add_lang_sbox}."
+
+        if add_LLM_sbox == "ChatGPT":
+            model_check = "gpt-5-mini" if add_model_checkbox else "gpt-5-nano"
+            route = Route("openai", model_check)
+            fallback = Route("anthropic", "claude-haiku-4-5-20251001")
         else:
-            model_check = "gpt-5-nano"
-        response = openAI_client.responses.create(
-            model=model_check,
-            input=prompt,
-            stream=True,
-        )
+            model_check = "claude-sonnet-4-5-20250929" if add_model_checkbox else "claude-haiku-4-5-20251001"
+            route = Route("anthropic", model_check)
+            fallback = Route("openai", "gpt-5-nano")
 
-        def stream_text():
-            for event in response:
-                if event.type == "response.output_text.delta":
-                    yield event.delta
+        summary_cache = get_summary_cache()
+        cache_key = summary_key(document, add_sum_sbox, add_lang_sbox, model_check)
+        cached = summary_cache.get(cache_key) if document else None
 
-        st.write_stream(stream_text())
+        if cached is not None:
+            count("summary_cache_hit", 1)
+            st.write_stream(replay(cached.decode("utf-8")))
 
-    else:
-        if add_model_checkbox:
-            model_check = "claude-sonnet-4-5-20250929"
         else:
-            model_check = "claude-haiku-4-5-20251001"
-        
-        with anthropic_client.messages.stream(
-            model=model_check,
-            max_tokens=1024,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        ) as stream:
-            st.write_stream(stream.text_stream)
\ No newline at end of file
+            count("prompt_tokens", count_tokens(prompt))
+            served_by = []
+            try:
+                summary = st.write_stream(trace.stream(llm.stream(
+                    route, [{"role": "user", "content": prompt}], fallback=fallback, hedge=add_hedge_checkbox,
+                    on_route=served_by.append
+                )))
+            except Exception as e:
+                st.error(f"{add_LLM_sbox} could not summarize this page: {e}")
+                summary = None
+            # The cache is keyed on the chosen model, so a summary the fallback wrote isn't stored.
+            if document and summary and served_by[-1:] == [route]:
+                summary_cache.set(cache_key, summary.encode("utf-8"))
+
+    trace.finish()
+
+show_timings("hw2", trace)
@@ -1,8 +1,11 @@
 import streamlit as st
-import requests
-from bs4 import BeautifulSoup
-from openai import OpenAI
-from anthropic import Anthropic
+from utils.fetch import fetch_many
+from utils.context import RollingSummary, budgeted_messages
+from utils.ingest import html_to_text
+from utils.llm import LLM, Route
+from utils.passages import index_page, select_passages
+from utils.resources import get_anthropic_client, get_openai_client
+from utils.tracing import show_timings, start_trace
 
 st.title("HW3: Chatbot with URL Context")
 
@@ -11,9 +14,9 @@ st.write(
     This chatbot allows you to:
     • Choose between two large language models (OpenAI GPT-5 or Anthropic Claude Sonnet)
     • Provide up to two URLs as permanent context
-    • Chat with short-term conversation memory (last 3 user–assistant exchanges)
+    • Chat with conversation memory (recent exchanges verbatim, older ones summarized)
 
-    The URL content is added as system context and is never discarded.
+    For each question, the most relevant passages from the URLs are added as system context.
     """
 )
 
@@ -25,6 +28,11 @@ model_choice = st.sidebar.selectbox(
     ["GPT-5 (OpenAI)", "Claude Sonnet (Anthropic)"]
 )
 
+hedge = st.sidebar.checkbox(
+    "Hedge slow requests",
+    help="If the first words are slower than usual, also ask the other provider and use whichever answers first."
+)
+
 url1 = st.sidebar.text_input("URL 1 (optional)")
 url2 = st.sidebar.text_input("URL 2 (optional)")
 
@@ -32,76 +40,87 @@ url2 = st.sidebar.text_input("URL 2 (optional)")
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
-if "url_context" not in st.session_state:
-    st.session_state.url_context = ""
-
+if "url_pages" not in st.session_state:
+    st.session_state.url_pages = {}
 
-openai_client = OpenAI(api_key=st.secrets["EddieOpenAPIKey"])
-anthropic_client = Anthropic(api_key=st.secrets["EddieClaudeAPIKey"])
+if "history_summary" not in st.session_state:
+    st.session_state.history_summary = RollingSummary()
 
 
-def read_url_content(url):
-    try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, "html.parser")
-        return soup.get_text(separator=" ", strip=True)
-    except Exception as e:
-        return f"Error reading {url}: {e}"
+openai_client = get_openai_client()
+anthropic_client = get_anthropic_client()
+llm = LLM(openai_client, anthropic_client)
 
-if (url1 or url2) and not st.session_state.url_context:
-    combined_text = ""
+ROUTES = {
+    "GPT-5 (OpenAI)": (Route("openai", "gpt-5"), Route("anthropic", "claude-haiku-4-5-20251001")),
+    "Claude Sonnet (Anthropic)": (Route("anthropic", "claude-3-5-sonnet-20241022"), Route("openai", "gpt-5-mini")),
+}
 
-    if url1:
-        combined_text += read_url_content(url1) + "\n\n"
 
-    if url2:
-        combined_text += read_url_content(url2)
+def page_text(result):
+    if not result.ok:
+        return f"Error reading {result.url}: {result.error}"
+    return html_to_text(result.content)
 
-    st.session_state.url_context = combined_text[:4000]
+trace = None
+urls = [url for url in [url1, url2] if url]
+if set(urls) != set(st.session_state.url_pages):
+    trace = start_trace("hw3")
+    # Both pages download at the same time instead of one after the other.
+    st.session_state.url_pages = {result.url: page_text(result) for result in fetch_many(urls)}
 
 
-system_prompt = {
-    "role": "system",
-    "content": (
-        f"You are an assistant. Explain answers so someone with no prior knowledge can understand. Use the following URL content as background knowledge: {st.session_state.url_context}"
+def build_system_prompt(question):
+    # Pages are chunked and embedded once (cached by URL and content hash); each question then
+    # only pays for the passages that match it.
+    indexes = [index_page(openai_client, url, text) for url, text in st.session_state.url_pages.items()]
+    passages = select_passages(openai_client, indexes, question)
+    url_context = "".join(f"\n\n--- Source: {url} ---\n{passage}" for url, passage in passages)
+    return (
+        f"You are an assistant. Explain answers so someone with no prior knowledge can understand. Use the following URL content as background knowledge: {url_context}"
     )
-}
+
+
+def stream_reply(messages):
+    route, fallback = ROUTES[model_choice]
+    # The first message is the system prompt; llm.stream passes it the way each provider expects.
+    return llm.stream(route, messages[1:], system=messages[0]["content"], fallback=fallback, hedge=hedge)
 
 
 user_input = st.text_input("Ask a question:")
 
+
+for msg in st.session_state.messages:
+    st.chat_message(msg["role"]).markdown(msg["content"])
+
 if user_input:
+    trace = trace or start_trace("hw3")
     st.session_state.messages.append(
         {"role": "user", "content": user_input}
     )
+    st.chat_message("user").markdown(user_input)
 
 
-    message_buffer = st.session_state.messages[-6:]
-
-    full_messages = [system_prompt] + message_buffer
+    messages = budgeted_messages(
+        build_system_prompt(user_input), user_input, st.session_state.messages[:-1],
+        summary=st.session_state.history_summary, client=openai_client
+    )
 
+    with st.chat_message("assistant"):
+        try:
+            bot_reply = st.write_stream(trace.stream(stream_reply(messages)))
+        except Exception as e:
+            st.error(f"The model did not answer: {e}")
+            bot_reply = None
 
-    if model_choice == "GPT-5 (OpenAI)":
-        response = openai_client.responses.create(
-            model="gpt-5",
-            input=full_messages
+    if bot_reply:
+        st.session_state.messages.append(
+            {"role": "assistant", "content": bot_reply}
         )
-        bot_reply = response.output_text
-
-
     else:
-        response = anthropic_client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=1024,
-            messages=full_messages
-        )
-        bot_reply = response.content[0].text
+        # Keep history in user/assistant pairs; the unanswered question can just be asked again.
+        st.session_state.messages.pop()
 
-    st.session_state.messages.append(
-        {"role": "assistant", "content": bot_reply}
-    )
-
-
-for msg in st.session_state.messages:
-    st.chat_message(msg["role"]).markdown(msg["content"])
+if trace:
+    trace.finish()
+show_timings("hw3", trace)
@@ -1,16 +1,17 @@
 import streamlit as st
-from openai import OpenAI
-import chromadb
 from pathlib import Path
-from bs4 import BeautifulSoup
+from utils.answer_cache import get_answer_cache
+from utils.context import RollingSummary, budgeted_messages, turns_to_messages
+from utils.embeddings import embed_query
+from utils.ingest import ORGS_FOLDER
+from utils.org_records import results_context
+from utils.resources import active_db_path, current_index_version, get_collection, get_openai_client
+from utils.retrieval import lexical_only, retrieve
+from utils.tracing import show_timings, start_trace
 
 st.title("Syracuse University Student Organizations Chatbot")
 
 
-if "openai_client" not in st.session_state:
-    st.session_state.openai_client = OpenAI(api_key=st.secrets["EddieOpenAPIKey"])
-
-
 if "conversation_history" not in st.session_state:
     st.session_state.conversation_history = []
 
@@ -19,137 +20,56 @@ if "messages" not in st.session_state:
     st.session_state.messages = []
 
 
-def extract_text_from_html(file_path):
-    with open(file_path, "r", encoding="utf-8") as f:
-        soup = BeautifulSoup(f.read(), "html.parser")
-    
-
-    for element in soup(["script", "style"]):
-        element.decompose()
-    
-
-    text = soup.get_text(separator=" ", strip=True)
-    return text
-
-
-def chunk_document(text, filename):
-    '''
-    I am chunking this document using the "split in the middle and then look for a nearby sentence boundary" approach. 
-    I chose this because it creates two reasonably sized chunks while trying to preserve sentence integrity. 
-    The 200 character lookahead is a simple to find a natural split point without making the chunks too small.
-    '''
-    midpoint = len(text) // 2
-    split_point = midpoint
-    for i in range(midpoint, min(midpoint + 200, len(text))):
-        if text[i] in '.!?\n':
-            split_point = i + 1
-            break
-    
-    chunk1 = text[:split_point].strip()
-    chunk2 = text[split_point:].strip()
-    
-    return [
-        {"text": chunk1, "id": f"{filename}_chunk1", "metadata": {"source": filename, "chunk": 1}},
-        {"text": chunk2, "id": f"{filename}_chunk2", "metadata": {"source": filename, "chunk": 2}}
-    ]
-
-
-def add_chunks_to_collection(collection, chunks):
-    client = st.session_state.openai_client
-    
-    for chunk in chunks:
-        if not chunk["text"]: 
-            continue
-            
-        response = client.embeddings.create(
-            input=[chunk["text"]],
-            model="text-embedding-3-small"
-        )
-        embedding = response.data[0].embedding
-        
-        collection.add(
-            documents=[chunk["text"]],
-            embeddings=[embedding],
-            ids=[chunk["id"]],
-            metadatas=[chunk["metadata"]]
-        )
+if "history_summary" not in st.session_state:
+    st.session_state.history_summary = RollingSummary()
 
 
 def initialize_vector_db():
-    db_path = "./ChromaDB_for_HW4"
-    chroma_client = chromadb.PersistentClient(path=db_path)
-    collection = chroma_client.get_or_create_collection("StudentOrgsCollection")
-    
-    if collection.count() > 0:
-        st.sidebar.success(f"Vector DB loaded with {collection.count()} chunks")
-        return collection
-    
-    folder_path = "data/HW-04-Data/su_orgs" 
-    html_files = list(Path(folder_path).glob("*.html"))
-    
-    if not html_files:
-        st.error(f"No HTML files found in {folder_path}. Please add the student organization HTML files.")
-        return collection
+    if not list(Path(ORGS_FOLDER).glob("*.html")):
+        st.error(f"No HTML files found in {ORGS_FOLDER}. Please add the student organization HTML files.")
     
     progress_bar = st.sidebar.progress(0)
     status_text = st.sidebar.empty()
+
+    def show_progress(files_done, total_files, chunks_written):
+        status_text.text(f"Read {files_done}/{total_files} changed files, embedded {chunks_written} chunks")
+        progress_bar.progress(files_done / total_files)
     
-    for i, file in enumerate(html_files):
-        status_text.text(f"Processing: {file.name}")
-        text = extract_text_from_html(file)
-        chunks = chunk_document(text, file.name)
-        add_chunks_to_collection(collection, chunks)
-        progress_bar.progress((i + 1) / len(html_files))
+    collection, summary = get_collection(progress=show_progress)
     
-    status_text.text(f"Indexed {len(html_files)} files ({collection.count()} chunks)")
     progress_bar.empty()
+    status_text.empty()
+    if summary:
+        st.sidebar.success(
+            f"Vector DB loaded with {collection.count()} chunks "
+            f"({summary['unchanged']} files unchanged, {summary['reembedded']} re-embedded, {summary['removed']} removed)"
+        )
+    else:
+        st.sidebar.success(f"Vector DB loaded with {collection.count()} chunks")
     
     return collection
 
 
 def query_vector_db(collection, query, n_results=3):
-    client = st.session_state.openai_client
+    client = get_openai_client()
     
-    response = client.embeddings.create(
-        input=[query],
-        model="text-embedding-3-small"
-    )
-    query_embedding = response.data[0].embedding
-    
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=n_results
-    )
+    results = retrieve(collection, client, query, n_results, active_db_path())
     
     return results
 
 
 def result_context(results):
-    context = ""
-    retrieved_docs = results["documents"][0]
-    retrieved_metadatas = results["metadatas"][0]
-    
-    for i in range(len(retrieved_docs)):
-        source = retrieved_metadatas[i]["source"]
-        context += f"\n\n--- Source: {source} ---\n{retrieved_docs[i]}"
-    
-    return context
+    # Chunks, then each source's org record, the same context HW5's search tool returns.
+    return results_context(results, active_db_path())
 
 
 def convo_context():
-    history = st.session_state.conversation_history[-5:]  
-    
-    messages = []
-    for interaction in history:
-        messages.append({"role": "user", "content": interaction["user"]})
-        messages.append({"role": "assistant", "content": interaction["assistant"]})
-    
-    return messages
+    return turns_to_messages(st.session_state.conversation_history)
 
 
 def generate_response(query, context):
-    """Generate a response using the LLM with RAG context and conversation memory."""
-    client = st.session_state.openai_client
+    """Stream a response from the LLM with RAG context and conversation memory, one text delta at a time."""
+    client = get_openai_client()
     
     system_prompt = """You are a helpful Syracuse Student Organizations assistant chatbot. 
 Your role is to answer questions about student organizations at the Syracuse University iSchool.
@@ -170,26 +90,27 @@ Relevant Documentation:
 Use the above documentation to answer the user's question. Cite sources when applicable.
 """
     
-    messages = [{"role": "system", "content": system_prompt}]
-    
-    messages.extend(convo_context())
-    
-    messages.append({"role": "user", "content": f"{rag_context}\n\nQuestion: {query}"})
+    # Recent turns are kept while they fit the token budget; older ones live on in a summary.
+    messages = budgeted_messages(
+        system_prompt, f"{rag_context}\n\nQuestion: {query}", convo_context(),
+        summary=st.session_state.history_summary, client=client
+    )
     
-    response = client.chat.completions.create(
+    stream = client.chat.completions.create(
         model="gpt-4o-mini", 
-        messages=messages
+        messages=messages,
+        stream=True
     )
     
-    return response.choices[0].message.content
-
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
 
 
-if "HW4_VectorDB" not in st.session_state:
-    with st.spinner("Initializing vector database..."):
-        st.session_state.HW4_VectorDB = initialize_vector_db()
 
-collection = st.session_state.HW4_VectorDB
+with st.spinner("Initializing vector database..."):
+    collection = initialize_vector_db()
+answer_cache = get_answer_cache("hw4")
 
 
 st.sidebar.header("About")
@@ -198,17 +119,27 @@ This chatbot uses RAG (Retrieval-Augmented Generation) to answer questions about
 
 **Features:**
 - Searches through organization documentation
-- Remembers last 5 conversation exchanges
+- Remembers the conversation (older exchanges are summarized)
 - Cites sources in responses
 """)
 
+with st.sidebar.expander("Answer cache"):
+    cache_stats = answer_cache.stats()
+    st.write(
+        f"{cache_stats['hits']} hits / {cache_stats['misses']} misses "
+        f"({cache_stats['hit_rate']:.0%}), {cache_stats['entries']} cached answers, "
+        f"similarity threshold {cache_stats['threshold']}"
+    )
+
 
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
 
+trace = None
 if prompt := st.chat_input("Ask about student organizations..."):
+    trace = start_trace("hw4")
     st.session_state.messages.append({"role": "user", "content": prompt})
     with st.chat_message("user"):
         st.markdown(prompt)
@@ -217,13 +148,29 @@ if prompt := st.chat_input("Ask about student organizations..."):
     with st.chat_message("assistant"):
         with st.spinner("Searching and thinking..."):
 
-            results = query_vector_db(collection, prompt)
-            context = result_context(results)
-            
-
-            response = generate_response(prompt, context)
-            
+            # Follow-up questions lean on the conversation so far, so only first questions are shared.
+            first_question = not st.session_state.conversation_history
+            cached = None
+            lexical = None
+            if first_question:
+                # A decisive BM25 match answers without any network call, so the cache is only
+                # checked by exact question text rather than embedding the question for it.
+                lexical = lexical_only(prompt, 3, active_db_path())
+                query_embedding = None if lexical else embed_query(get_openai_client(), prompt)
+                cached = answer_cache.lookup(query_embedding, current_index_version(), question=prompt)
+
+            if not cached:
+                results = lexical or query_vector_db(collection, prompt)
+                context = result_context(results)
+                
+
+        if cached:
+            response = cached[0]
             st.markdown(response)
+        else:
+            response = st.write_stream(trace.stream(generate_response(prompt, context)))
+            if first_question:
+                answer_cache.store(query_embedding, prompt, response, current_index_version())
     
 
     st.session_state.messages.append({"role": "assistant", "content": response})
@@ -231,7 +178,6 @@ if prompt := st.chat_input("Ask about student organizations..."):
         "user": prompt,
         "assistant": response
     })
-    
+    trace.finish()
 
-    if len(st.session_state.conversation_history) > 5:
-        st.session_state.conversation_history = st.session_state.conversation_history[-5:]
\ No newline at end of file
+show_timings("hw4", trace)
@@ -1,103 +1,56 @@
 import streamlit as st
-from openai import OpenAI
-import chromadb
 import json
-from pathlib import Path
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+import time
+from typing import Iterator
+from utils.answer_cache import get_answer_cache
+from utils.context import RollingSummary, budgeted_messages, turns_to_messages
+from utils.embeddings import embed_query
+from utils.org_records import FIELDS, lookup_orgs, results_context
+from utils.resources import active_db_path, current_index_version, get_collection, get_openai_client
+from utils.retrieval import lexical_only, retrieve_many
+from utils.speculation import get_path_stats, prefetch, queries_equivalent
+from utils.tracing import in_context, show_timings, span, start_trace, stream_span
+
+TOOL_RESULT_TOKENS = 1500
 
 st.title("HW 5: SU Org Search")
 
-if "openai_client" not in st.session_state:
-    st.session_state.openai_client = OpenAI(api_key=st.secrets["EddieOpenAPIKey"])
-
 if "conversation_history" not in st.session_state:
     st.session_state.conversation_history = []
 
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
-
-def extract_text_from_html(file_path):
-    with open(file_path, "r", encoding="utf-8") as f:
-        soup = BeautifulSoup(f.read(), "html.parser")
-    for element in soup(["script", "style"]):
-        element.decompose()
-    return soup.get_text(separator=" ", strip=True)
-
-
-def chunk_document(text, filename):
-    midpoint = len(text) // 2
-    split_point = midpoint
-    for i in range(midpoint, min(midpoint + 200, len(text))):
-        if text[i] in '.!?\n':
-            split_point = i + 1
-            break
-    chunk1 = text[:split_point].strip()
-    chunk2 = text[split_point:].strip()
-    return [
-        {"text": chunk1, "id": f"{filename}_chunk1", "metadata": {"source": filename, "chunk": 1}},
-        {"text": chunk2, "id": f"{filename}_chunk2", "metadata": {"source": filename, "chunk": 2}}
-    ]
-
-
-def add_chunks_to_collection(collection, chunks):
-    client = st.session_state.openai_client
-    for chunk in chunks:
-        if not chunk["text"]:
-            continue
-        response = client.embeddings.create(
-            input=[chunk["text"]],
-            model="text-embedding-3-small"
-        )
-        embedding = response.data[0].embedding
-        collection.add(
-            documents=[chunk["text"]],
-            embeddings=[embedding],
-            ids=[chunk["id"]],
-            metadatas=[chunk["metadata"]]
-        )
+if "history_summary" not in st.session_state:
+    st.session_state.history_summary = RollingSummary()
 
 
-def initialize_vector_db():
-    chroma_client = chromadb.PersistentClient(path="./ChromaDB_for_HW4")
-    collection = chroma_client.get_or_create_collection("StudentOrgsCollection")
-
-    if collection.count() > 0:
-        return collection
+def format_club_info(results: dict) -> str:
+    context = results_context(results, active_db_path())
+    return context if context.strip() else "No relevant information found in the knowledge base."
 
-    html_files = list(Path("data/HW-04-Data/su_orgs").glob("*.html"))
-    for file in html_files:
-        text = extract_text_from_html(file)
-        chunks = chunk_document(text, file.name)
-        add_chunks_to_collection(collection, chunks)
 
-    return collection
+def relevant_club_info_batch(queries: list, n_results: list) -> list:
+    """Answers several relevant_club_info calls with one embeddings request and one batched query."""
+    collection, _ = get_collection()
+    results = retrieve_many(collection, get_openai_client(), queries, n_results, active_db_path())
+    return [format_club_info(r) for r in results]
 
 
 def relevant_club_info(query: str, n_results: int = 3) -> str:
-    client = st.session_state.openai_client
-    collection = st.session_state.HW5_VectorDB
+    return relevant_club_info_batch([query], [n_results])[0]
 
-    response = client.embeddings.create(
-        input=[query],
-        model="text-embedding-3-small"
-    )
-    query_embedding = response.data[0].embedding
-
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=n_results
-    )
 
-    retrieved_docs = results["documents"][0]
-    retrieved_metadatas = results["metadatas"][0]
-
-    context = ""
-    for i in range(len(retrieved_docs)):
-        source = retrieved_metadatas[i]["source"]
-        context += f"\n\n--- Source: {source} ---\n{retrieved_docs[i]}"
-
-    return context if context.strip() else "No relevant information found in the knowledge base."
+def org_lookup(name: str = None, category: str = None, fields: list = None) -> str:
+    """Exact-field answers straight from the org records table; no embedding or vector query."""
+    if not name and not category:
+        return "org_lookup needs a name or a category."
+    with span("record_lookup"):
+        records = lookup_orgs(active_db_path(), name=name, category=category, fields=fields)
+    if not records:
+        return "No organization matched. Try relevant_club_info to search descriptions instead."
+    return json.dumps(records, indent=1)
 
 
 tools = [
@@ -127,6 +80,36 @@ tools = [
                 "required": ["query"]
             }
         }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "org_lookup",
+            "description": (
+                "Looks up specific fields of organizations by name or category, such as the contact "
+                "email, primary contact, phone, address, website, social media, category, meeting "
+                "info, officers or how to join (membership). Use this instead of relevant_club_info when the question names an organization "
+                "and asks for a particular detail, or asks which organizations are in a category."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "name": {
+                        "type": "string",
+                        "description": "The organization's full or short name."
+                    },
+                    "category": {
+                        "type": "string",
+                        "description": "Organization type, e.g. 'Graduate Student Organization'."
+                    },
+                    "fields": {
+                        "type": "array",
+                        "items": {"type": "string", "enum": FIELDS},
+                        "description": "Fields to return. Defaults to all of them."
+                    }
+                }
+            }
+        }
     }
 ]
 
@@ -136,80 +119,232 @@ def build_messages(user_query: str) -> list:
         "You are a helpful Syracuse University iSchool Student Organizations assistant. "
         "You answer questions about student clubs and organizations. "
         "When you need information about a specific club or topic, call the relevant_club_info function. "
+        "For a specific detail of a named organization (contact, email, website, category, meetings), "
+        "or to list organizations in a category, call the org_lookup function instead. "
         "Always cite the source document when referencing retrieved information (e.g., 'According to [filename]...'). "
         "If the knowledge base does not contain the answer, say so clearly. "
         "Do not fabricate information. Do not include links in your responses."
     )
 
-    messages = [{"role": "system", "content": system_prompt}]
+    # Tool results are appended after this, so leave room for them in the budget.
+    return budgeted_messages(
+        system_prompt, user_query, turns_to_messages(st.session_state.conversation_history),
+        summary=st.session_state.history_summary, client=get_openai_client(), reserve=TOOL_RESULT_TOKENS
+    )
 
-    for interaction in st.session_state.conversation_history[-5:]:
-        messages.append({"role": "user", "content": interaction["user"]})
-        messages.append({"role": "assistant", "content": interaction["assistant"]})
 
-    messages.append({"role": "user", "content": user_query})
-    return messages
+def stream_completion(client, tool_calls: dict, **kwargs) -> Iterator[str]:
+    """
+    Starts a streamed gpt-4o-mini completion, yields its text deltas and collects any tool call
+    deltas into tool_calls. The request is only sent on the first next(), so a stream_span
+    around this times the request too.
+    """
+    stream = client.chat.completions.create(model="gpt-4o-mini", stream=True, **kwargs)
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            yield delta.content
+        for call in delta.tool_calls or []:
+            entry = tool_calls.setdefault(call.index, {"id": "", "name": "", "arguments": ""})
+            entry["id"] = call.id or entry["id"]
+            if call.function:
+                entry["name"] += call.function.name or ""
+                entry["arguments"] += call.function.arguments or ""
+
+
+def run_other_tool(name: str, args: dict) -> str:
+    if name == "org_lookup":
+        return org_lookup(args.get("name"), args.get("category"), args.get("fields"))
+    return f"Unknown tool: {name}"
+
+
+def run_tool_calls(calls: list, user_query: str, prefetched: dict = None) -> list:
+    """
+    Resolves every tool call from one model turn together. All relevant_club_info calls (say one
+    per club in a comparison question) share a single batched retrieval, and that batch runs
+    concurrently with any other tool calls. Calls whose query is equivalent to the one in
+    `prefetched` ({"query", "n_results", "result"}) reuse its result instead.
+    Returns (tool_call_id, result) pairs in call order.
+    """
+    args = [json.loads(call["arguments"] or "{}") for call in calls]
+    club_calls = [i for i, call in enumerate(calls) if call["name"] == "relevant_club_info"]
+    results = {}
+
+    if prefetched:
+        for i in club_calls:
+            if (args[i].get("n_results", 3) == prefetched["n_results"]
+                    and queries_equivalent(args[i].get("query", user_query), prefetched["query"])):
+                results[i] = prefetched["result"]
+    to_fetch = [i for i in club_calls if i not in results]
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = {
+            i: pool.submit(in_context(run_other_tool), call["name"], args[i])
+            for i, call in enumerate(calls) if i not in club_calls
+        }
+        # The batch runs on this thread (it needs the Streamlit-cached collection and client)
+        # while the pool works through everything else.
+        if to_fetch:
+            batch = relevant_club_info_batch(
+                [args[i].get("query", user_query) for i in to_fetch],
+                [args[i].get("n_results", 3) for i in to_fetch]
+            )
+            results.update(zip(to_fetch, batch))
+        for i, future in futures.items():
+            results[i] = future.result()
+
+    return [(call["id"], results[i]) for i, call in enumerate(calls)]
+
+
+def assistant_tool_message(calls: list, content: str = None) -> dict:
+    return {
+        "role": "assistant",
+        "content": content or None,
+        "tool_calls": [
+            {"id": call["id"], "type": "function",
+             "function": {"name": call["name"], "arguments": call["arguments"]}}
+            for call in calls
+        ]
+    }
 
 
-def generate_response(user_query: str) -> str:
-    client = st.session_state.openai_client
+def generate_response(user_query: str, speculative: bool = True, lexical: dict = None) -> Iterator[str]:
+    """
+    Streams the answer. With `speculative` on, the router completion (the one that decides on a
+    tool call) no longer waits for retrieval and vice versa:
+      - skip_router: the BM25 index is decisive for the raw question, so we answer straight
+        away with that context and never make the router call;
+      - prefetch_hit / prefetch_miss: retrieval for the raw question runs while the router
+        call is in flight, and is used if the model asks for an equivalent query;
+      - no_tool: the model answered without the tool.
+    With it off, every question is recorded as baseline (router call, then retrieval, then the
+    answer), the sequential path the others are compared against.
+    Each path's latency is recorded in the "hw5" PathStats. `lexical` is the page's
+    lexical_only() result for the question (None when BM25 isn't decisive).
+
+    The trace gets the tool-routing call as llm_router and the answer call as llm, each with
+    its own _ttft, so neither includes retrieval or tool time. When the model answers without
+    a tool, the router call is the answer and there is no llm span.
+    """
+    client = get_openai_client()
     messages = build_messages(user_query)
-
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
-        tools=tools,
-        tool_choice="auto"
+    stats = get_path_stats("hw5")
+    start = time.perf_counter()
+    first_token = None
+
+    prefetch_future = None
+    if speculative:
+        if lexical:
+            # Present the context exactly as if the model had called the tool itself.
+            call = {"id": "call_prefetch", "name": "relevant_club_info",
+                    "arguments": json.dumps({"query": user_query})}
+            messages.append(assistant_tool_message([call]))
+            messages.append({"role": "tool", "tool_call_id": call["id"], "content": format_club_info(lexical)})
+            for delta in stream_span("llm", stream_completion(client, {}, messages=messages)):
+                first_token = first_token or time.perf_counter() - start
+                yield delta
+            stats.record("skip_router", first_token, time.perf_counter() - start)
+            return
+
+        collection, _ = get_collection()
+        prefetch_future = prefetch(retrieve_many, collection, client, [user_query], [3], active_db_path())
+
+    tool_calls = {}
+    # If the model answers directly, its text streams straight through.
+    content = ""
+    router = stream_completion(client, tool_calls, messages=messages, tools=tools, tool_choice="auto")
+    for delta in stream_span("llm_router", router):
+        first_token = first_token or time.perf_counter() - start
+        content += delta
+        yield delta
+
+    if not tool_calls:
+        stats.record("no_tool" if speculative else "baseline", first_token, time.perf_counter() - start)
+        return
+
+    messages.append(assistant_tool_message(list(tool_calls.values()), content))
+
+    prefetched = None
+    if prefetch_future:
+        prefetched = {"query": user_query, "n_results": 3, "result": format_club_info(prefetch_future.result()[0])}
+    tool_results = run_tool_calls(list(tool_calls.values()), user_query, prefetched)
+    for call_id, function_result in tool_results:
+        messages.append({
+            "role": "tool",
+            "tool_call_id": call_id,
+            "content": function_result
+        })
+
+    for delta in stream_span("llm", stream_completion(client, {}, messages=messages)):
+        first_token = first_token or time.perf_counter() - start
+        yield delta
+
+    if speculative:
+        used_prefetch = prefetched and any(result is prefetched["result"] for _, result in tool_results)
+        stats.record("prefetch_hit" if used_prefetch else "prefetch_miss", first_token, time.perf_counter() - start)
+    else:
+        stats.record("baseline", first_token, time.perf_counter() - start)
+
+
+# The collection is opened by the startup warm-up (utils/warmup.py) or the first question, not
+# on every render, so the page is interactive before chromadb has even been imported.
+answer_cache = get_answer_cache("hw5")
+
+speculative = st.sidebar.toggle("Speculative retrieval", value=True,
+                                help="Start retrieval alongside the tool-routing call, or skip that call when the match is obvious.")
+
+with st.sidebar.expander("Answer cache"):
+    cache_stats = answer_cache.stats()
+    st.write(
+        f"{cache_stats['hits']} hits / {cache_stats['misses']} misses "
+        f"({cache_stats['hit_rate']:.0%}), {cache_stats['entries']} cached answers, "
+        f"similarity threshold {cache_stats['threshold']}"
     )
 
-    response_message = response.choices[0].message
-
-    if response_message.tool_calls:
-        messages.append(response_message)
-
-        for tool_call in response_message.tool_calls:
-            if tool_call.function.name == "relevant_club_info":
-                args = json.loads(tool_call.function.arguments)
-                function_result = relevant_club_info(
-                    query=args.get("query", user_query),
-                    n_results=args.get("n_results", 3)
-                )
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "content": function_result
-                })
-
-        final_response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages
-        )
-        return final_response.choices[0].message.content
-
-    return response_message.content
-
-
-if "HW5_VectorDB" not in st.session_state:
-    st.session_state.HW5_VectorDB = initialize_vector_db()
+with st.sidebar.expander("Speculative retrieval stats"):
+    path_rows, hit_rate = get_path_stats("hw5").summary()
+    if hit_rate is not None:
+        st.write(f"Prefetch hit rate: {hit_rate:.0%}")
+    for path, row in path_rows.items():
+        ttft = f"{row['ttft_p50']:.2f}s" if row["ttft_p50"] is not None else "n/a"
+        st.write(f"**{path}**: {row['count']} ({row['share']:.0%}), p50 first token {ttft}, p50 total {row['total_p50']:.2f}s")
 
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
+trace = None
 if prompt := st.chat_input("Ask about student organizations..."):
+    trace = start_trace("hw5")
     st.session_state.messages.append({"role": "user", "content": prompt})
     with st.chat_message("user"):
         st.markdown(prompt)
 
     with st.chat_message("assistant"):
-        response = generate_response(prompt)
-        st.markdown(response)
+        # Follow-up questions lean on the conversation so far, so only first questions are shared.
+        first_question = not st.session_state.conversation_history
+        cached = None
+        # Checked up front so a decisive BM25 match reaches skip_router without any network
+        # call: the answer cache is then only consulted by exact question text.
+        lexical = lexical_only(prompt, 3, active_db_path()) if speculative else None
+        if first_question:
+            query_embedding = None if lexical else embed_query(get_openai_client(), prompt)
+            cached = answer_cache.lookup(query_embedding, current_index_version(), question=prompt)
+        if cached:
+            response = cached[0]
+            st.markdown(response)
+        else:
+            response = st.write_stream(generate_response(prompt, speculative, lexical))
+            if first_question:
+                answer_cache.store(query_embedding, prompt, response, current_index_version())
 
     st.session_state.messages.append({"role": "assistant", "content": response})
     st.session_state.conversation_history.append({
         "user": prompt,
         "assistant": response
     })
+    trace.finish()
 
-    if len(st.session_state.conversation_history) > 5:
-        st.session_state.conversation_history = st.session_state.conversation_history[-5:]
+show_timings("hw5", trace)
@@ -0,0 +1,119 @@
+'''
+Compares query latency and memory of the Chroma collection and the NumPy index on the same data.
+
+    python -m scripts.bench_backends                   # uses the current snapshot
+    python -m scripts.bench_backends --root /tmp/index --queries 500
+
+Each backend runs in its own subprocess so the RSS numbers don't include the other one.
+Queries are chunk vectors stored in Chroma with a little noise added, so no embedding calls are
+made. Indexes built without SU_ORGS_BACKEND=numpy have no NumPy export; one is then made from
+the Chroma vectors into a temporary directory for the run, leaving the index untouched.
+'''
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from utils.ingest import COLLECTION_NAME, DB_PATH
+from utils.snapshots import current_snapshot
+
+
+def _rss_mb():
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _collection(db_path):
+    import chromadb
+    return chromadb.PersistentClient(path=db_path).get_collection(COLLECTION_NAME)
+
+
+def run_backend(backend, db_path, queries, n_results):
+    before = _rss_mb()
+    start = time.perf_counter()
+    if backend == "numpy":
+        from utils.numpy_index import load_numpy_index
+        index = load_numpy_index(db_path)
+    else:
+        index = _collection(db_path)
+    open_seconds = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.query(query_embeddings=[query], n_results=n_results)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "backend": backend,
+        "open_ms": round(open_seconds * 1000, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "rss_added_mb": round(_rss_mb() - before, 1),
+        "peak_rss_mb": round(_rss_mb(), 1),
+    }
+
+
+def make_queries(db_path, count, seed=0):
+    vectors = np.asarray(_collection(db_path).get(include=["embeddings"])["embeddings"], dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.integers(0, len(vectors), count)]
+    noisy = picks + rng.normal(0, 0.02, picks.shape).astype(np.float32)
+    return noisy.tolist()
+
+
+def numpy_root(db_path):
+    '''Where the NumPy index for db_path lives, and a temporary directory to delete afterwards (or None).'''
+    from utils.numpy_index import NUMPY_INDEX_DIR, current_generation, save_numpy_index
+    if current_generation(os.path.join(db_path, NUMPY_INDEX_DIR)):
+        return db_path, None
+    workdir = tempfile.mkdtemp()
+    save_numpy_index(_collection(db_path), workdir)
+    return workdir, workdir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default=DB_PATH, help="snapshot root, or a plain index directory")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--n-results", type=int, default=3)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--db-path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    db_path = args.db_path or current_snapshot(args.root) or args.root
+
+    if args.backend:
+        queries = json.load(sys.stdin)
+        print(json.dumps(run_backend(args.backend, db_path, queries, args.n_results)))
+        return
+
+    queries = json.dumps(make_queries(db_path, args.queries))
+    numpy_path, workdir = numpy_root(db_path)
+    print(f"{args.queries} queries against {db_path}" + (" (NumPy index exported for this run)" if workdir else "") + "\n")
+    print(f"{'backend':<8} {'open ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'RSS added MB':>13} {'peak RSS MB':>12}")
+    try:
+        for backend, path in [("chroma", db_path), ("numpy", numpy_path)]:
+            output = subprocess.run(
+                [sys.executable, "-m", "scripts.bench_backends", "--db-path", path, "--backend", backend,
+                 "--n-results", str(args.n_results)],
+                input=queries, capture_output=True, text=True, check=True
+            ).stdout
+            r = json.loads(output.strip().splitlines()[-1])
+            print(f"{r['backend']:<8} {r['open_ms']:>9} {r['p50_ms']:>9} {r['p95_ms']:>9} "
+                  f"{r['rss_added_mb']:>13} {r['peak_rss_mb']:>12}")
+    finally:
+        if workdir:
+            shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
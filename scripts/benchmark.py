@@ -0,0 +1,181 @@
+'''
+Reproducible offline benchmark of the su_orgs pipeline: extraction, chunking, the index build
+behind HW4's initialize_vector_db, and the retrieval behind HW5's relevant_club_info, answered
+through the fake chat backend. Embeddings and chat come from scripts/fake_openai_server.py
+running in-process, so nothing leaves the machine and every run sees the same vectors.
+
+    python -m scripts.benchmark                                  # writes bench_results/latest.json
+    python -m scripts.benchmark --out bench_results/base.json
+    python -m scripts.benchmark --baseline bench_results/base.json --fail-on-regression
+
+Recall@k uses the labeled questions in scripts/bench_questions.json: the share of each
+question's relevant pages that show up among the sources of the top k chunks. Caches go to a
+temporary directory, so the app's own caches neither help nor get touched.
+'''
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+QUESTIONS_FILE = os.path.join(os.path.dirname(__file__), "bench_questions.json")
+# Metrics where a bigger number is better; for every other metric smaller is better.
+HIGHER_IS_BETTER = {"extract_files_per_s", "chunk_chunks_per_s", "build_chunks_per_s", "recall_at_k"}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux; children covers the extraction process pool.
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / 1024, 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def run(args, workdir):
+    # Imported here so APP_CACHE_DIR is set before utils.kv_cache reads it.
+    import chromadb
+    from openai import OpenAI
+
+    from scripts.fake_openai_server import start_server
+    from utils.ingest import COLLECTION_NAME, ORGS_FOLDER, chunk_document, iter_extracted, sync_collection
+    from utils.numpy_index import load_numpy_index
+    from utils.retrieval import retrieve
+
+    server = start_server()
+    client = OpenAI(api_key="fake", base_url=f"http://127.0.0.1:{server.server_port}/v1")
+    files = sorted(Path(args.folder or ORGS_FOLDER).glob("*.html"))[:args.limit or None]
+    metrics = {}
+
+    start = time.perf_counter()
+    texts = {file: text for file, text, _ in iter_extracted(files)}
+    elapsed = time.perf_counter() - start
+    metrics["extract_files_per_s"] = round(len(files) / elapsed, 1)
+
+    start = time.perf_counter()
+    chunks = [chunk for file, text in texts.items() for chunk in chunk_document(text, file.name)]
+    elapsed = time.perf_counter() - start
+    metrics["chunk_chunks_per_s"] = round(len(chunks) / elapsed, 1)
+
+    # The same sync HW4's initialize_vector_db runs through get_collection, on an empty index.
+    db_path = os.path.join(workdir, "index")
+    collection = chromadb.PersistentClient(path=db_path).get_or_create_collection(COLLECTION_NAME)
+    start = time.perf_counter()
+    summary = sync_collection(collection, client, files, db_path, export_numpy=args.backend == "numpy")
+    metrics["build_seconds"] = round(time.perf_counter() - start, 3)
+    metrics["build_chunks_per_s"] = round(summary["chunks_written"] / metrics["build_seconds"], 1)
+
+    index = load_numpy_index(db_path) if args.backend == "numpy" else collection
+    with open(args.questions, "r", encoding="utf-8") as f:
+        questions = json.load(f)
+
+    latencies = []
+    answer_latencies = []
+    recalls = []
+    for _ in range(args.repeat):
+        for item in questions:
+            start = time.perf_counter()
+            results = retrieve(index, client, item["question"], args.k, db_path)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+            sources = {metadata["source"] for metadata in results["metadatas"][0]}
+            recalls.append(len(sources & set(item["relevant"])) / len(item["relevant"]))
+
+            context = "".join(f"\n\n--- Source: {m['source']} ---\n{d}"
+                              for d, m in zip(results["documents"][0], results["metadatas"][0]))
+            start = time.perf_counter()
+            stream = client.chat.completions.create(
+                model="gpt-4o-mini", stream=True,
+                messages=[{"role": "system", "content": context}, {"role": "user", "content": item["question"]}],
+            )
+            for _ in stream:
+                pass
+            answer_latencies.append((time.perf_counter() - start) * 1000)
+
+    metrics["query_p50_ms"] = round(float(np.percentile(latencies, 50)), 3)
+    metrics["query_p99_ms"] = round(float(np.percentile(latencies, 99)), 3)
+    metrics["answer_p50_ms"] = round(float(np.percentile(answer_latencies, 50)), 3)
+    metrics["recall_at_k"] = round(float(np.mean(recalls)), 4)
+    metrics["peak_rss_mb"] = peak_rss_mb()
+    server.shutdown()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "backend": args.backend,
+            "files": len(files),
+            "chunks": len(chunks),
+            "questions": len(questions),
+            "k": args.k,
+        },
+        "metrics": metrics,
+    }
+
+
+def compare(current, baseline, tolerance):
+    '''Prints each metric next to the baseline and returns the names of those that got worse.'''
+    regressions = []
+    print(f"\n{'metric':<22} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, value in current["metrics"].items():
+        before = baseline["metrics"].get(name)
+        if before is None:
+            print(f"{name:<22} {'-':>12} {value:>12}")
+            continue
+        change = (value - before) / before if before else 0.0
+        worse = -change if name in HIGHER_IS_BETTER else change
+        flag = "  worse" if worse > tolerance else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<22} {before:>12} {value:>12} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    # The default is utils.ingest.ORGS_FOLDER, resolved in run() once APP_CACHE_DIR is set.
+    parser.add_argument("--folder", help="folder of org pages (default: the one the app indexes)")
+    parser.add_argument("--limit", type=int, default=0, help="only use the first N files")
+    parser.add_argument("--questions", default=QUESTIONS_FILE)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5, help="times to run the question set")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="chroma")
+    parser.add_argument("--out", default="bench_results/latest.json")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="relative change counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ["APP_CACHE_DIR"] = os.path.join(workdir, "cache")
+        result = run(args, workdir)
+
+    print(json.dumps(result, indent=2))
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nSaved to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions and args.fail_on_regression:
+            sys.exit(f"\nRegressed: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
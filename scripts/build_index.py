@@ -0,0 +1,46 @@
+'''
+Builds the su_orgs index offline and publishes it as the snapshot the app serves.
+
+    OPENAI_API_KEY=... python -m scripts.build_index
+    python -m scripts.build_index --root ./ChromaDB_for_HW4 --keep 3
+
+Running apps switch to the new snapshot on their next rerun; nothing needs restarting.
+OPENAI_BASE_URL can point the build at another endpoint (e.g. scripts/fake_openai_server.py).
+'''
+import argparse
+import logging
+import sys
+import time
+
+from openai import OpenAI
+
+from utils.ingest import DB_PATH, ORGS_FOLDER
+from utils.snapshots import KEEP_SNAPSHOTS, build_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default=DB_PATH, help="directory holding the snapshots")
+    parser.add_argument("--folder", default=ORGS_FOLDER, help="directory of org HTML pages")
+    parser.add_argument("--keep", type=int, default=KEEP_SNAPSHOTS, help="how many complete snapshots to keep")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    def show_progress(files_done, total_files, chunks_written):
+        sys.stderr.write(f"\r{files_done}/{total_files} files read, {chunks_written} chunks embedded")
+        sys.stderr.flush()
+
+    start = time.perf_counter()
+    path, summary = build_snapshot(OpenAI(), root=args.root, folder=args.folder, keep=args.keep,
+                                   progress=show_progress)
+    sys.stderr.write("\n")
+    print(
+        f"Built {path} in {time.perf_counter() - start:.1f}s: {summary['chunks']} chunks, "
+        f"{summary['reembedded']} files re-embedded, {summary['unchanged']} unchanged, {summary['removed']} removed"
+    )
+
+
+if __name__ == "__main__":
+    main()
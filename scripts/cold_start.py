@@ -0,0 +1,162 @@
+'''
+Measures cold start: how long after `streamlit run` the default page (HW5) is interactive for
+the first visitor, and when the background warm-up (utils/warmup.py) has the index, clients
+and caches ready. Each run starts a fresh server against the in-process fake OpenAI/Anthropic
+server with its own cache directory and trace log, so runs don't warm each other up.
+
+The servers serve a throwaway snapshot built once per invocation from the fake server's vectors
+(SU_ORGS_DB_PATH, with SU_ORGS_BUILD_ON_REQUEST=0), so the app's own ./ChromaDB_for_HW4 and
+caches are never synced with fake embeddings.
+
+    python -m scripts.cold_start
+    python -m scripts.cold_start --runs 5 --no-warmup
+
+"server up" is when /_stcore/health answers; "first page" is when a websocket session that
+connected right then gets script_finished for its first run, which is what a browser sees.
+'''
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from websockets.sync.client import connect
+
+from scripts.fake_openai_server import start_server
+
+STARTUP_TIMEOUT = 120
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_health(port, deadline):
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError("server did not come up")
+
+
+def first_page(port, deadline):
+    '''Opens a session like a browser does and returns once its first script run has finished.'''
+    with connect(f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=["streamlit"], max_size=None) as ws:
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        ws.send(message.SerializeToString())
+        while time.monotonic() < deadline:
+            forward = ForwardMsg()
+            forward.ParseFromString(ws.recv(timeout=max(deadline - time.monotonic(), 0.1)))
+            if forward.WhichOneof("type") == "script_finished":
+                return
+    raise TimeoutError("first page did not finish")
+
+
+def read_startup_spans(trace_log, deadline):
+    '''The spans the app logged for its startup page, once the warm-up record is there.'''
+    while time.monotonic() < deadline:
+        spans = {}
+        if os.path.exists(trace_log):
+            with open(trace_log, "r", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record["page"] == "startup":
+                        spans.update(record["spans"])
+        if "warm_ready" in spans:
+            return spans
+        time.sleep(0.1)
+    return spans
+
+
+def fake_env(fake_port, workdir):
+    return dict(
+        os.environ,
+        OPENAI_API_KEY="fake",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{fake_port}/v1",
+        ANTHROPIC_BASE_URL=f"http://127.0.0.1:{fake_port}",
+        APP_CACHE_DIR=os.path.join(workdir, "cache"),
+    )
+
+
+def build_index(fake_port, workdir):
+    '''Builds the snapshot every run serves; returns its root.'''
+    root = os.path.join(workdir, "index")
+    subprocess.run(
+        [sys.executable, "-m", "scripts.build_index", "--root", root],
+        env=fake_env(fake_port, os.path.join(workdir, "build")), check=True,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    return root
+
+
+def run_once(args, fake_port, index_root):
+    with tempfile.TemporaryDirectory() as workdir:
+        secrets = os.path.join(workdir, "secrets.toml")
+        with open(secrets, "w", encoding="utf-8") as f:
+            f.write('EddieOpenAPIKey = "fake"\nEddieClaudeAPIKey = "fake"\n')
+        trace_log = os.path.join(workdir, "traces.jsonl")
+        env = dict(
+            fake_env(fake_port, workdir),
+            TRACE_LOG=trace_log,
+            APP_WARMUP="0" if args.no_warmup else "1",
+            SU_ORGS_DB_PATH=index_root,
+            SU_ORGS_BUILD_ON_REQUEST="0",
+        )
+        port = free_port()
+        command = [
+            sys.executable, "-m", "streamlit", "run", "streamlit_app.py",
+            "--server.headless", "true", "--server.port", str(port),
+            "--server.enableXsrfProtection", "false", "--browser.gatherUsageStats", "false",
+            "--secrets.files", secrets,
+        ]
+        start = time.monotonic()
+        deadline = start + STARTUP_TIMEOUT
+        process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_health(port, deadline)
+            server_up = time.monotonic() - start
+            first_page(port, deadline)
+            page_ready = time.monotonic() - start
+            spans = read_startup_spans(trace_log, deadline) if not args.no_warmup else {}
+        finally:
+            process.terminate()
+            process.wait()
+    return {"server_up": server_up, "first_page": page_ready, **{f"app_{k}": v for k, v in spans.items()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--no-warmup", action="store_true", help="start the app with APP_WARMUP=0")
+    args = parser.parse_args()
+
+    fake = start_server()
+    with tempfile.TemporaryDirectory() as workdir:
+        index_root = build_index(fake.server_port, workdir)
+        results = [run_once(args, fake.server_port, index_root) for _ in range(args.runs)]
+    fake.shutdown()
+
+    names = list(dict.fromkeys(name for result in results for name in result))
+    print(f"{args.runs} cold starts, warm-up {'off' if args.no_warmup else 'on'} (seconds after `streamlit run`;"
+          f" app_* spans are logged by the app itself)\n")
+    print(f"{'stage':<20} {'p50':>8} {'max':>8}")
+    for name in names:
+        values = [result[name] for result in results if name in result]
+        print(f"{name:<20} {np.percentile(values, 50):>8.3f} {max(values):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+'''
+A tiny stand-in for the OpenAI API (embeddings, chat completions and responses, streamed or
+not) and the Anthropic messages API, so ingestion and the chat pages can be exercised without
+spending tokens.
+
+    python -m scripts.fake_openai_server --port 8765 --latency 0.2 --rate-limit 0.05
+    python -m scripts.fake_openai_server --slow-rate 0.1 --slow-latency 4 --error-rate 0.02
+
+Point OPENAI_BASE_URL at http://127.0.0.1:8765/v1 and ANTHROPIC_BASE_URL at http://127.0.0.1:8765.
+
+Embeddings are deterministic hashed bag-of-words vectors, so texts that share words end up
+close to each other and retrieval still behaves sensibly.
+'''
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DIMENSIONS = 1536
+
+
+def fake_embedding(text, dimensions=DIMENSIONS):
+    vector = [0.0] * dimensions
+    for word in re.findall(r"\w+", text.lower()):
+        digest = hashlib.md5(word.encode("utf-8")).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dimensions
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    rate_limit = 0.0
+    token_delay = 0.0
+    slow_rate = 0.0
+    slow_latency = 0.0
+    error_rate = 0.0
+    stats = {"requests": 0, "inputs": 0, "rate_limited": 0, "chat_requests": 0}
+    stats_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            with self.stats_lock:
+                self._send_json(200, dict(self.stats))
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def _send_events(self, events):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        try:
+            for event in events:
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(self.token_delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client hung up, e.g. a hedged request that lost the race
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        path = self.path.rstrip("/")
+
+        if not path.endswith(("/embeddings", "/chat/completions", "/responses", "/messages")):
+            self._send_json(404, {"error": {"message": f"unsupported path {self.path}"}})
+            return
+
+        if random.random() < self.rate_limit:
+            with self.stats_lock:
+                self.stats["rate_limited"] += 1
+            self._send_json(429, {"error": {"message": "rate limited", "type": "rate_limit"}},
+                            headers={"retry-after": "0.2"})
+            return
+
+        if random.random() < self.error_rate:
+            with self.stats_lock:
+                self.stats["server_errors"] = self.stats.get("server_errors", 0) + 1
+            self._send_json(503, {"error": {"message": "overloaded", "type": "overloaded_error"}})
+            return
+
+        # A small share of slow requests gives the latency distribution a long tail.
+        time.sleep(self.slow_latency if random.random() < self.slow_rate else self.latency)
+        if path.endswith("/embeddings"):
+            self._embeddings(body)
+        elif path.endswith("/responses"):
+            self._responses(body)
+        elif path.endswith("/messages"):
+            self._anthropic_messages(body)
+        else:
+            self._chat_completions(body)
+
+    def _embeddings(self, body):
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dimensions = body.get("dimensions") or DIMENSIONS
+
+        with self.stats_lock:
+            self.stats["requests"] += 1
+            self.stats["inputs"] += len(inputs)
+
+        self._send_json(200, {
+            "object": "list",
+            "model": body.get("model", "text-embedding-3-small"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text, dimensions)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+    def _chat_completions(self, body):
+        with self.stats_lock:
+            self.stats["chat_requests"] += 1
+
+        messages = body.get("messages", [])
+        tool_calls = fake_tool_calls(messages, body.get("tools"))
+        content = None if tool_calls else fake_reply(messages)
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model", "fake")}
+
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": content}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            self._send_json(200, dict(base, object="chat.completion", choices=[{
+                "index": 0, "message": message, "finish_reason": "tool_calls" if tool_calls else "stop",
+            }], usage={"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}))
+            return
+
+        def chunk(delta, finish_reason=None):
+            return dict(base, object="chat.completion.chunk",
+                        choices=[{"index": 0, "delta": delta, "finish_reason": finish_reason}])
+
+        events = [chunk({"role": "assistant", "content": ""})]
+        if tool_calls:
+            events += [chunk({"tool_calls": [dict(call, index=i)]}) for i, call in enumerate(tool_calls)]
+            events.append(chunk({}, "tool_calls"))
+        else:
+            events += [chunk({"content": word}) for word in re.findall(r"\S+\s*", content)]
+            events.append(chunk({}, "stop"))
+        self._send_events(events)
+
+    def _responses(self, body):
+        with self.stats_lock:
+            self.stats["chat_requests"] += 1
+
+        messages = body.get("input", [])
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+        text = fake_reply(messages)
+        response = {
+            "id": "resp_fake", "object": "response", "created_at": int(time.time()), "status": "completed",
+            "model": body.get("model", "fake"), "output": [{
+                "id": "msg_fake", "type": "message", "role": "assistant", "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }],
+            "parallel_tool_calls": False, "tool_choice": "auto", "tools": [],
+        }
+
+        if not body.get("stream"):
+            self._send_json(200, response)
+            return
+
+        events = [{"type": "response.created", "sequence_number": 0, "response": dict(response, status="in_progress", output=[])}]
+        for word in re.findall(r"\S+\s*", text):
+            events.append({"type": "response.output_text.delta", "sequence_number": len(events), "item_id": "msg_fake",
+                           "output_index": 0, "content_index": 0, "delta": word, "logprobs": []})
+        events.append({"type": "response.completed", "sequence_number": len(events), "response": response})
+        self._send_events(events)
+
+    def _anthropic_messages(self, body):
+        with self.stats_lock:
+            self.stats["chat_requests"] += 1
+
+        messages = body.get("messages", [])
+        if body.get("system"):
+            messages = [{"role": "system", "content": body["system"]}] + messages
+        text = fake_reply(messages)
+        message = {
+            "id": "msg_fake", "type": "message", "role": "assistant", "model": body.get("model", "fake"),
+            "content": [{"type": "text", "text": text}], "stop_reason": "end_turn", "stop_sequence": None,
+            "usage": {"input_tokens": 0, "output_tokens": 0},
+        }
+
+        if not body.get("stream"):
+            self._send_json(200, message)
+            return
+
+        events = [
+            {"type": "message_start", "message": dict(message, content=[], stop_reason=None)},
+            {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+        ]
+        events += [{"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": word}}
+                   for word in re.findall(r"\S+\s*", text)]
+        events += [
+            {"type": "content_block_stop", "index": 0},
+            {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+             "usage": {"output_tokens": 0}},
+            {"type": "message_stop"},
+        ]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        try:
+            for event in events:
+                self.wfile.write(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(self.token_delay)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client hung up, e.g. a hedged request that lost the race
+
+
+def _text(content):
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+def fake_tool_calls(messages, tools):
+    '''Calls the first tool with the user's question, unless tool results are already in the conversation.'''
+    if not tools or any(m.get("role") == "tool" for m in messages):
+        return []
+    question = next((_text(m.get("content")) for m in reversed(messages) if m.get("role") == "user"), "")
+    return [{
+        "id": "call_0",
+        "type": "function",
+        "function": {"name": tools[0]["function"]["name"], "arguments": json.dumps({"query": question})},
+    }]
+
+
+def fake_reply(messages):
+    '''A deterministic answer that names the sources it was given, so callers can check retrieval.'''
+    question = next((_text(m.get("content")) for m in reversed(messages) if m.get("role") == "user"), "")
+    context = " ".join(_text(m.get("content")) for m in messages if m.get("role") in ("user", "tool", "system"))
+    sources = list(dict.fromkeys(re.findall(r"--- Source: (\S+) ---", context)))
+    answer = f"This is a fake answer to: {question.splitlines()[-1] if question else ''}"
+    if sources:
+        answer += " According to " + ", ".join(sources) + "."
+    return answer
+
+
+def start_server(port=0, latency=0.0, rate_limit=0.0, token_delay=0.0, slow_rate=0.0, slow_latency=0.0,
+                 error_rate=0.0):
+    '''Starts the server on a background thread and returns it; server.server_port has the real port.'''
+    handler = type("Handler", (FakeOpenAIHandler,), {
+        "latency": latency,
+        "rate_limit": rate_limit,
+        "token_delay": token_delay,
+        "slow_rate": slow_rate,
+        "slow_latency": slow_latency,
+        "error_rate": error_rate,
+        "stats": {"requests": 0, "inputs": 0, "rate_limited": 0, "chat_requests": 0},
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests delayed by --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=0.0, help="latency of the slow requests, in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    server = start_server(args.port, args.latency, args.rate_limit, args.token_delay, args.slow_rate,
+                          args.slow_latency, args.error_rate)
+    print(f"Fake OpenAI API on http://127.0.0.1:{server.server_port}/v1, "
+          f"Anthropic API on http://127.0.0.1:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
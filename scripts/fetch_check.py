@@ -0,0 +1,144 @@
+'''
+Exercises utils/fetch.py against a local HTTP server: revalidation with ETag and Last-Modified,
+the byte cap on an oversized page, parallel fetching and error reporting.
+
+    python -m scripts.fetch_check
+    python -m scripts.fetch_check --delay 0.5     # each page takes 0.5 s to answer
+
+Uses a throwaway cache file, so the app's own cache is left alone.
+'''
+import argparse
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.fetch import HttpCache, fetch, fetch_many
+
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+HUGE_BYTES = 20 * 1024 * 1024
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    hits = {}
+    hits_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _count(self, kind):
+        with self.hits_lock:
+            self.hits[kind] = self.hits.get(kind, 0) + 1
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        if self.path == "/huge":
+            self._count("full")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.end_headers()
+            # No Content-Length: the cap has to hold while streaming, not just from the header.
+            block = b"<p>" + b"x" * 65_000 + b"</p>"
+            try:
+                for _ in range(HUGE_BYTES // len(block)):
+                    self.wfile.write(block)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            return
+
+        if self.path.startswith("/missing"):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = f"<html><body><h1>Page {self.path}</h1><p>Some text.</p></body></html>".encode("utf-8")
+        etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        use_etag = self.path.startswith("/etag")
+        use_date = self.path.startswith("/dated")
+
+        if (use_etag and self.headers.get("If-None-Match") == etag) or \
+                (use_date and self.headers.get("If-Modified-Since") == LAST_MODIFIED):
+            self._count("not_modified")
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        self._count("full")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        if use_etag:
+            self.send_header("ETag", etag)
+        if use_date:
+            self.send_header("Last-Modified", LAST_MODIFIED)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server(delay=0.0):
+    handler = type("Handler", (PageHandler,), {"delay": delay, "hits": {}})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check(label, condition):
+    print(f"{'ok  ' if condition else 'FAIL'} {label}")
+    return condition
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delay", type=float, default=0.3, help="seconds the server waits before answering")
+    args = parser.parse_args()
+
+    server = start_server(args.delay)
+    base = f"http://127.0.0.1:{server.server_port}"
+    cache = HttpCache(os.path.join(tempfile.mkdtemp(), "http.sqlite"), max_bytes=1024 * 1024)
+    passed = True
+
+    first = fetch(base + "/etag/a", cache=cache)
+    second = fetch(base + "/etag/a", cache=cache)
+    passed &= check("ETag page is revalidated with a 304",
+                    first.status == 200 and second.status == 304 and second.from_cache
+                    and second.content == first.content)
+
+    first = fetch(base + "/dated/a", cache=cache)
+    second = fetch(base + "/dated/a", cache=cache)
+    passed &= check("Last-Modified page is revalidated with a 304", second.from_cache and second.content == first.content)
+
+    fetch(base + "/plain", cache=cache)
+    passed &= check("page without validators is not cached", not fetch(base + "/plain", cache=cache).from_cache)
+
+    huge = fetch(base + "/huge", cache=False, max_bytes=1024 * 1024)
+    passed &= check(f"oversized page stops at the cap ({len(huge.content)} bytes)",
+                    huge.truncated and len(huge.content) == 1024 * 1024)
+
+    missing = fetch(base + "/missing", cache=cache)
+    passed &= check("HTTP errors come back as results, not exceptions", not missing.ok and "404" in missing.error)
+
+    urls = [f"{base}/plain/{i}" for i in range(6)]
+    start = time.perf_counter()
+    results = fetch_many(urls, cache=False)
+    elapsed = time.perf_counter() - start
+    passed &= check(f"{len(urls)} pages fetched in parallel in {elapsed:.2f}s (serial would take {len(urls) * args.delay:.2f}s)",
+                    all(r.ok for r in results) and [r.url for r in results] == urls
+                    and elapsed < len(urls) * args.delay * 0.6)
+
+    for i in range(30):
+        cache.set(f"{base}/filler/{i}", {"etag": "x"}, b"y" * 100_000)
+    kept = [cache.get(f"{base}/filler/{i}") for i in range(30)]
+    size = sum(len(entry[1]) for entry in kept if entry)
+    passed &= check(f"cache stays under its byte limit ({size} bytes of filler kept)", size <= 1024 * 1024)
+
+    print(f"\nserver hits: {server.RequestHandlerClass.hits}")
+    server.shutdown()
+    raise SystemExit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+'''
+Times a cold build of the su_orgs index into a throwaway Chroma directory.
+
+    python -m scripts.ingest_throughput                      # starts a local fake endpoint
+    python -m scripts.ingest_throughput --base-url http://127.0.0.1:8765/v1 --latency 0.2
+
+Pass a real --base-url and OPENAI_API_KEY to measure against OpenAI itself.
+'''
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import chromadb
+from openai import OpenAI
+
+from scripts.fake_openai_server import start_server
+from utils.ingest import COLLECTION_NAME, ORGS_FOLDER, build_collection
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="embeddings endpoint; a local fake one is started if omitted")
+    parser.add_argument("--latency", type=float, default=0.2, help="latency for the local fake endpoint")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="429 rate for the local fake endpoint")
+    parser.add_argument("--limit", type=int, help="only index the first N files")
+    parser.add_argument("--use-cache", action="store_true", help="read through the on-disk embedding cache")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server = start_server(latency=args.latency, rate_limit=args.rate_limit)
+        base_url = f"http://127.0.0.1:{server.server_port}/v1"
+
+    client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY", "fake-key"), base_url=base_url)
+    html_files = sorted(Path(ORGS_FOLDER).glob("*.html"))[:args.limit]
+
+    with tempfile.TemporaryDirectory() as db_path:
+        collection = chromadb.PersistentClient(path=db_path).get_or_create_collection(COLLECTION_NAME)
+        start = time.perf_counter()
+        chunk_count = build_collection(collection, client, html_files, cache=None if args.use_cache else False)
+        elapsed = time.perf_counter() - start
+        stored = collection.count()
+
+    print(f"files:        {len(html_files)}")
+    print(f"chunks:       {chunk_count} ({stored} stored)")
+    print(f"elapsed:      {elapsed:.2f}s")
+    print(f"files/sec:    {len(html_files) / elapsed:.1f}")
+    print(f"chunks/sec:   {chunk_count / elapsed:.1f}")
+    if server:
+        stats = server.RequestHandlerClass.stats
+        print(f"API requests: {stats['requests']} ({stats['rate_limited']} rate limited)")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+'''
+Runs utils/llm.py against the fake provider server with a long latency tail and some 503s,
+with and without hedging, and reports time to first token.
+
+    python -m scripts.llm_hedging_check
+    python -m scripts.llm_hedging_check --calls 200 --slow-rate 0.05 --slow-latency 3 --error-rate 0.05
+
+The hedged run warms the latency tracker first, so its threshold is the measured p95.
+'''
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from anthropic import Anthropic
+from openai import OpenAI
+
+from scripts.fake_openai_server import start_server
+from utils.llm import HEDGE_MIN_SAMPLES, LLM, LatencyTracker, Route
+
+PRIMARY = Route("openai", "gpt-5-mini")
+FALLBACK = Route("anthropic", "claude-haiku-4-5-20251001")
+
+
+def run(llm, calls, concurrency, hedge):
+    def one(i):
+        start = time.perf_counter()
+        first = None
+        try:
+            for _ in llm.stream(PRIMARY, [{"role": "user", "content": f"Question {i}"}],
+                                fallback=FALLBACK, hedge=hedge, deadline=30):
+                first = first or time.perf_counter() - start
+            return first, None
+        except Exception as e:
+            return None, type(e).__name__
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(calls)))
+    ttfts = [ttft for ttft, _ in results if ttft is not None]
+    errors = [error for _, error in results if error]
+    return ttfts, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=2.0)
+    parser.add_argument("--error-rate", type=float, default=0.03)
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency, slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+                          error_rate=args.error_rate)
+    base = f"http://127.0.0.1:{server.server_port}"
+    openai_client = OpenAI(api_key="fake", base_url=base + "/v1")
+    anthropic_client = Anthropic(api_key="fake", base_url=base)
+
+    print(f"{args.calls} calls, {args.concurrency} at a time; {args.slow_rate:.0%} take {args.slow_latency}s, "
+          f"{args.error_rate:.0%} fail with 503\n")
+    print(f"{'mode':<10} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'max s':>7} {'failed':>7}")
+    for hedge in [False, True]:
+        llm = LLM(openai_client, anthropic_client, tracker=LatencyTracker())
+        if hedge:
+            run(llm, HEDGE_MIN_SAMPLES * 2, args.concurrency, hedge=False)
+        ttfts, errors = run(llm, args.calls, args.concurrency, hedge)
+        p50, p95, p99 = np.percentile(ttfts, [50, 95, 99])
+        print(f"{'hedged' if hedge else 'plain':<10} {p50:>7.3f} {p95:>7.3f} {p99:>7.3f} {max(ttfts):>7.3f} "
+              f"{len(errors):>7}")
+        if hedge:
+            print(f"\nhedge threshold used: {llm.tracker.hedge_threshold(PRIMARY):.3f}s")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+'''
+Shows how much vector memory each compact storage option saves and how much recall it costs.
+
+    python -m scripts.quantization_report                  # uses the current snapshot
+    python -m scripts.quantization_report --root /tmp/index --k 3 --queries 300
+
+Recall@k is measured against exact float32 search over the full vectors, both for the compact
+pass alone and after rescoring its top candidates at full precision (what the app does).
+Queries are stored chunk vectors plus noise, so no embedding calls are made. It reads the
+NumPy export, which only exists for indexes built with SU_ORGS_BACKEND=numpy; compact copies the
+build didn't save are made in memory, so nothing is written to the index.
+
+Run it on an index built with real embeddings: text-embedding-3 vectors are trained so the
+leading dimensions carry most of the signal, while the hashed vectors from
+scripts/fake_openai_server.py spread it evenly and make truncation look far worse than it is.
+'''
+import argparse
+import os
+import time
+
+import numpy as np
+
+from utils.ingest import DB_PATH
+from utils.numpy_index import NUMPY_INDEX_DIR, NumpyIndex, current_generation
+from utils.snapshots import current_snapshot
+
+CONFIGS = [
+    ("none", None),
+    ("float16", None),
+    ("int8", None),
+    ("float16", 512),
+    ("int8", 512),
+    ("int8", 256),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default=DB_PATH, help="snapshot root, or a plain index directory")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.01, help="per-dimension noise added to query vectors")
+    args = parser.parse_args()
+
+    source = current_generation(os.path.join(current_snapshot(args.root) or args.root, NUMPY_INDEX_DIR))
+    if source is None:
+        parser.error("no NumPy index found; build one with SU_ORGS_BACKEND=numpy python -m scripts.build_index")
+
+    exact = NumpyIndex(source, quantization="none")
+    rng = np.random.default_rng(0)
+    rows = exact.vectors[rng.integers(0, exact.count(), args.queries)]
+    queries = rows + rng.normal(0, args.noise, rows.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = [set(exact.search(q, args.k)[0].tolist()) for q in queries]
+    full_bytes = exact.memory_bytes()
+
+    print(f"{exact.count()} vectors x {exact.vectors.shape[1]} dims, {args.queries} queries, recall@{args.k}\n")
+    print(f"{'storage':<16} {'MB':>8} {'saved':>7} {'recall':>8} {'+rescore':>9} {'p50 ms':>8}")
+    for quantization, dimensions in CONFIGS:
+        index = NumpyIndex(source, quantization=quantization, dimensions=dimensions)
+        recall_raw = []
+        recall_rescored = []
+        latencies = []
+        for query, expected in zip(queries, truth):
+            recall_raw.append(len(expected & set(index.search(query, args.k, rescore=False)[0].tolist())) / args.k)
+            start = time.perf_counter()
+            found = index.search(query, args.k)[0]
+            latencies.append((time.perf_counter() - start) * 1000)
+            recall_rescored.append(len(expected & set(found.tolist())) / args.k)
+
+        label = f"{quantization}/{dimensions or 'full'}"
+        size = index.memory_bytes()
+        print(f"{label:<16} {size / 1e6:>8.2f} {1 - size / full_bytes:>7.0%} {np.mean(recall_raw):>8.3f} "
+              f"{np.mean(recall_rescored):>9.3f} {np.percentile(latencies, 50):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,9 @@
 import streamlit as st
+from utils.warmup import mark_first_page, start_warmup
+
+# Starts the background thread that opens the index, clients and caches. It waits for
+# mark_first_page() below, so the work begins once the first page has finished rendering.
+start_warmup()
 
 Lab1 = st.Page('hws/hw1.py',
     title = "HW 1",
@@ -33,3 +38,4 @@ Lab5 = st.Page('hws/hw5.py',
 pg = st.navigation ([Lab5,Lab4,Lab3,Lab2,Lab1])
 st.set_page_config(page_title='Lab Manager')
 pg.run()
+mark_first_page()
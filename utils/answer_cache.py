@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = 24 * 60 * 60
+ANSWER_CACHE_ENTRIES = 500
+
+
+class SemanticAnswerCache:
+    '''
+    Remembers answers by the embedding of the question that produced them. A new question whose
+    cosine similarity to a stored one is at least `threshold` gets the stored answer back without
+    calling the LLM. Entries expire after `ttl` seconds, the least recently used ones are dropped
+    past `max_entries`, and everything is cleared when the org index version changes.
+
+    Questions are also matched on their exact (case and whitespace normalized) text, which needs
+    no embedding. Pages that can answer without a network call, like a decisive BM25 match,
+    look up and store with embedding=None so that only the text is used.
+    '''
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, ttl=ANSWER_CACHE_TTL, max_entries=ANSWER_CACHE_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.index_version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _check_version(self, index_version):
+        if index_version != self.index_version:
+            self._entries.clear()
+            self.index_version = index_version
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for key in [key for key, entry in self._entries.items() if entry["created"] < cutoff]:
+            del self._entries[key]
+            self.evictions += 1
+
+    def lookup(self, embedding, index_version=None, question=None):
+        '''Returns (answer, similarity, cached_question) for the closest match, or None on a miss.'''
+        text = _normalize(question) if question else None
+        with self._lock:
+            self._check_version(index_version)
+            self._expire()
+            exact = next((key for key, entry in self._entries.items() if text and entry["text"] == text), None)
+            if exact is not None:
+                self.hits += 1
+                self._entries.move_to_end(exact)
+                entry = self._entries[exact]
+                return entry["answer"], 1.0, entry["question"]
+
+            keys = [key for key, entry in self._entries.items() if entry["embedding"] is not None]
+            if embedding is None or not keys:
+                self.misses += 1
+                return None
+
+            query = np.asarray(embedding, dtype=np.float32)
+            query /= np.linalg.norm(query) or 1.0
+            matrix = np.stack([self._entries[key]["embedding"] for key in keys])
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(keys[best])
+            entry = self._entries[keys[best]]
+            return entry["answer"], float(scores[best]), entry["question"]
+
+    def store(self, embedding, question, answer, index_version=None):
+        vector = None
+        if embedding is not None:
+            vector = np.asarray(embedding, dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+
+        with self._lock:
+            self._check_version(index_version)
+            self._entries[self._next_id] = {
+                "embedding": vector,
+                "question": question,
+                "text": _normalize(question),
+                "answer": answer,
+                "created": time.time(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "threshold": self.threshold,
+            }
+
+
+def _normalize(question):
+    return " ".join(question.lower().split())
+
+
+# Module level so every Streamlit session in this process shares the same cache per page.
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_answer_cache(name):
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = SemanticAnswerCache()
+        return _caches[name]
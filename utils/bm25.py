@@ -0,0 +1,108 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+BM25_FILE = "bm25.json"
+K1 = 1.5
+B = 0.75
+
+STOPWORDS = {
+    "a", "about", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from",
+    "how", "i", "in", "is", "it", "me", "my", "of", "on", "or", "tell", "that", "the", "their",
+    "there", "they", "this", "to", "what", "when", "where", "which", "who", "with", "you", "your",
+}
+
+
+def tokenize(text):
+    return [word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in STOPWORDS]
+
+
+class BM25Index:
+    '''
+    Inverted index over the same chunks that are in the vector store. Postings map each term to
+    (chunk position, term frequency) pairs, so a query only touches chunks that share a term.
+    '''
+
+    def __init__(self, ids, documents, metadatas, postings=None, lengths=None):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        if postings is None:
+            postings = defaultdict(list)
+            lengths = []
+            for position, document in enumerate(documents):
+                counts = Counter(tokenize(document))
+                lengths.append(sum(counts.values()))
+                for term, tf in counts.items():
+                    postings[term].append((position, tf))
+        self.postings = postings
+        self.lengths = lengths
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+
+    def idf(self, term):
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.ids) - df + 0.5) / (df + 0.5))
+
+    def search(self, query, k=10):
+        '''Returns up to k (position, score) pairs, best first.'''
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf(term)
+            for position, tf in self.postings.get(term, ()):
+                norm = K1 * (1 - B + B * self.lengths[position] / self.avg_length)
+                scores[position] += idf * tf * (K1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def save(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "ids": self.ids,
+                "documents": self.documents,
+                "metadatas": self.metadatas,
+                "postings": self.postings,
+                "lengths": self.lengths,
+            }, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["ids"], data["documents"], data["metadatas"], data["postings"], data["lengths"])
+
+    @classmethod
+    def from_collection(cls, collection):
+        data = collection.get(include=["documents", "metadatas"])
+        return cls(data["ids"], data["documents"], data["metadatas"])
+
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def load_bm25(db_path):
+    '''Loads the index saved next to the vector store, reloading only when the file changes.'''
+    path = os.path.join(db_path, BM25_FILE)
+    try:
+        mtime = os.path.getmtime(path)
+    except FileNotFoundError:
+        return None
+    with _loaded_lock:
+        if path not in _loaded or _loaded[path][0] != mtime:
+            _loaded[path] = (mtime, BM25Index.load(path))
+        return _loaded[path][1]
+
+
+def unload_bm25(db_path):
+    with _loaded_lock:
+        _loaded.pop(os.path.join(db_path, BM25_FILE), None)
+
+
+def save_bm25(collection, db_path):
+    index = BM25Index.from_collection(collection)
+    index.save(os.path.join(db_path, BM25_FILE))
+    return index
@@ -0,0 +1,124 @@
+'''
+Builds chat prompts that fit a token budget instead of keeping a fixed number of turns (HW3,
+HW4, HW5). Tokens are counted locally. The newest turns are kept verbatim for as long as they
+fit; older ones are folded into a rolling summary that a background thread keeps up to date,
+so a long conversation never makes the prompt (or the wait for the first token) grow.
+'''
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.tokens import count_tokens
+from utils.tracing import count
+
+logger = logging.getLogger(__name__)
+
+# Total prompt tokens for system prompt + retrieved context + history + question.
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CHAT_CONTEXT_TOKENS", "4000"))
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_MODEL = "gpt-4o-mini"
+SUMMARY_MAX_TOKENS = 300
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="summary")
+
+
+def message_tokens(message):
+    return count_tokens(message["content"] or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+class RollingSummary:
+    '''
+    Summary of the first `covered` messages of a conversation. refresh() folds newly dropped
+    messages in on a background thread; until it finishes, prompts use the previous summary.
+    Keep one per conversation in st.session_state.
+    '''
+
+    def __init__(self):
+        self.text = ""
+        self.covered = 0
+        self._lock = threading.Lock()
+        self._running = False
+
+    def refresh(self, client, dropped):
+        with self._lock:
+            if self._running or len(dropped) <= self.covered:
+                return
+            self._running = True
+            previous, new = self.text, dropped[self.covered:]
+            target = len(dropped)
+        _executor.submit(self._summarize, client, previous, new, target)
+
+    def _summarize(self, client, previous, new, target):
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in new)
+        try:
+            response = client.chat.completions.create(
+                model=SUMMARY_MODEL,
+                max_tokens=SUMMARY_MAX_TOKENS,
+                messages=[
+                    {"role": "system", "content": (
+                        "Update the running summary of a conversation with the new messages. Keep "
+                        "names, facts, preferences and open questions the assistant may need later. "
+                        "Reply with the summary only, in under 200 words."
+                    )},
+                    {"role": "user", "content": f"Current summary:\n{previous or '(none)'}\n\nNew messages:\n{transcript}"},
+                ]
+            )
+            text = response.choices[0].message.content or previous
+        except Exception:
+            # The prompt just goes on using the older summary; the next turn tries again.
+            logger.exception("Refreshing the conversation summary failed")
+            with self._lock:
+                self._running = False
+            return
+        with self._lock:
+            self.text = text
+            self.covered = target
+            self._running = False
+
+
+def fit_history(history, budget):
+    '''
+    Splits history (role/content messages, oldest first, in user/assistant pairs) into
+    (dropped, kept): kept is the longest run of whole pairs from the end that fits in budget.
+    '''
+    kept_from = len(history)
+    used = 0
+    while kept_from >= 2:
+        pair = sum(message_tokens(m) for m in history[kept_from - 2:kept_from])
+        if used + pair > budget:
+            break
+        used += pair
+        kept_from -= 2
+    return history[:kept_from], history[kept_from:]
+
+
+def budgeted_messages(system_prompt, user_content, history, budget=CONTEXT_TOKEN_BUDGET, summary=None,
+                      client=None, reserve=0):
+    '''
+    Returns the message list for a chat completion: the system prompt (plus the summary of older
+    turns, if any), as much recent history as fits, then the user message. `reserve` holds back
+    tokens for messages appended later, such as tool results. Retrieved context goes in either
+    system_prompt or user_content; both are always kept whole.
+    '''
+    fixed = count_tokens(system_prompt) + count_tokens(user_content) + 2 * MESSAGE_OVERHEAD_TOKENS + reserve
+    summary_tokens = count_tokens(summary.text) if summary and summary.text else 0
+    dropped, kept = fit_history(history, budget - fixed - summary_tokens)
+
+    if summary is not None and client is not None and dropped:
+        summary.refresh(client, dropped)
+
+    if summary and summary.text and dropped:
+        system_prompt += f"\n\nSummary of the earlier conversation:\n{summary.text}"
+    messages = [{"role": "system", "content": system_prompt}] + kept + [{"role": "user", "content": user_content}]
+    count("prompt_tokens", sum(message_tokens(m) for m in messages))
+    return messages
+
+
+def turns_to_messages(turns):
+    '''Flattens [{"user": ..., "assistant": ...}] turns into role/content messages.'''
+    messages = []
+    for turn in turns:
+        messages.append({"role": "user", "content": turn["user"]})
+        messages.append({"role": "assistant", "content": turn["assistant"]})
+    return messages
@@ -0,0 +1,67 @@
+'''
+Map-reduce question answering over large documents (HW1's large document mode). The text is
+cut into sections, BM25 picks the sections that mention the question's terms, each of those is
+answered on its own by a bounded pool of concurrent calls, and one final streamed call combines
+the partial answers. The work scales with how much of the document is relevant, not its size.
+'''
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.bm25 import BM25Index
+from utils.ingest import chunk_document
+
+SECTION_TOKENS = 1500
+SECTION_OVERLAP_TOKENS = 100
+MAX_SECTIONS = 8
+MAX_CONCURRENT_CALLS = 4
+NO_ANSWER = "NOT_IN_SECTION"
+
+
+def split_sections(text):
+    return [chunk["text"] for chunk in chunk_document(text, "document", SECTION_TOKENS, SECTION_OVERLAP_TOKENS)]
+
+
+def candidate_sections(sections, question, k=MAX_SECTIONS):
+    '''
+    The k sections BM25 scores highest for the question, in document order. If nothing matches
+    (a question with no words in common with the text), the first k sections stand in.
+    '''
+    index = BM25Index(list(range(len(sections))), sections, [{}] * len(sections))
+    hits = index.search(question, k=k)
+    positions = sorted(position for position, _ in hits) if hits else list(range(min(k, len(sections))))
+    return [(position, sections[position]) for position in positions]
+
+
+def partial_answer(client, model, question, section):
+    response = client.responses.create(
+        model=model,
+        input=(
+            f"Here is one section of a longer document:\n{section}\n\n"
+            f"Answer the question using only this section, quoting the relevant facts. "
+            f"If this section does not help answer it, reply with exactly {NO_ANSWER}.\n\n"
+            f"Question: {question}"
+        ),
+    )
+    return response.output_text
+
+
+def map_answers(client, model, question, sections, max_workers=MAX_CONCURRENT_CALLS):
+    '''Runs one partial-answer call per (position, section); returns (position, answer) pairs that found something.'''
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        answers = list(pool.map(lambda item: partial_answer(client, model, question, item[1]), sections))
+    return [(position, answer) for (position, _), answer in zip(sections, answers)
+            if answer and NO_ANSWER not in answer]
+
+
+def combine_answers(client, model, question, partials):
+    '''Starts the streamed call that merges the partial answers; returns the response stream.'''
+    notes = "\n\n".join(f"From section {position + 1}:\n{answer}" for position, answer in partials)
+    return client.responses.create(
+        model=model,
+        input=(
+            f"Several sections of a document were read separately to answer a question. "
+            f"Here is what each relevant section said:\n{notes or '(no section contained an answer)'}\n\n"
+            f"Combine these into one answer. If they disagree, say so. If none of them answer it, "
+            f"say the document does not appear to cover it.\n\nQuestion: {question}"
+        ),
+        stream=True,
+    )
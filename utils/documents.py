@@ -0,0 +1,90 @@
+'''
+Text extraction for uploaded documents (HW1). Extracted text is cached on disk by a hash of
+the file's bytes, so asking another question about the same upload skips parsing entirely.
+Large PDFs are split into page ranges that are parsed on a process pool.
+'''
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils.kv_cache import CACHE_DIR, SQLiteCache
+from utils.tracing import count, span
+
+# Bump whenever extraction changes so cached text from the old code isn't served.
+EXTRACTOR_VERSION = 1
+DOCUMENT_CACHE_BYTES = 500 * 1024 * 1024
+PARALLEL_MIN_PAGES = 40
+PAGES_PER_TASK = 16
+EXTRACT_WORKERS = min(os.cpu_count() or 1, 8)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_document_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SQLiteCache(os.path.join(CACHE_DIR, "documents.sqlite"), table="documents",
+                                 max_entries=1_000, max_bytes=DOCUMENT_CACHE_BYTES)
+        return _cache
+
+
+def _extract_pages(data, start, stop):
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(data))
+    return start, [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def extract_pdf_text(data, progress=None, max_workers=EXTRACT_WORKERS):
+    '''
+    Returns the text of every page joined by newlines. progress(pages_done, total_pages) is
+    called as page ranges finish. Parsing is CPU bound, so big files go to a "spawn" process
+    pool (see utils.ingest.iter_extracted for why spawn).
+    '''
+    from pypdf import PdfReader
+
+    total = len(PdfReader(io.BytesIO(data)).pages)
+    if total < PARALLEL_MIN_PAGES or max_workers <= 1:
+        pages = []
+        for start in range(0, total, PAGES_PER_TASK):
+            pages += _extract_pages(data, start, min(start + PAGES_PER_TASK, total))[1]
+            if progress:
+                progress(len(pages), total)
+        return "\n".join(pages)
+
+    pages = [None] * total
+    done = 0
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [
+            pool.submit(_extract_pages, data, start, min(start + PAGES_PER_TASK, total))
+            for start in range(0, total, PAGES_PER_TASK)
+        ]
+        for future in as_completed(futures):
+            start, texts = future.result()
+            pages[start:start + len(texts)] = texts
+            done += len(texts)
+            if progress:
+                progress(done, total)
+    return "\n".join(pages)
+
+
+def document_text(data, is_pdf, progress=None):
+    '''Text of an uploaded file, from the cache when these exact bytes have been seen before.'''
+    count("bytes_uploaded", len(data))
+    if not is_pdf:
+        return data.decode("utf-8")
+    key = f"v{EXTRACTOR_VERSION}:{hashlib.sha256(data).hexdigest()}"
+    cache = get_document_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        return cached.decode("utf-8")
+
+    with span("parse"):
+        text = extract_pdf_text(data, progress)
+    cache.set(key, text.encode("utf-8"))
+    return text
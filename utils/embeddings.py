@@ -0,0 +1,219 @@
+import array
+import hashlib
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from utils.kv_cache import CACHE_DIR, SQLiteCache
+from utils.tokens import count_tokens
+from utils.tracing import count, current_trace, span
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# OpenAI allows up to 2048 inputs and 300k tokens per embeddings request. We stay well under
+# both so one slow request doesn't hold up the whole build.
+MAX_TOKENS_PER_REQUEST = 100_000
+MAX_INPUTS_PER_REQUEST = 512
+MAX_INPUT_TOKENS = 8191
+MAX_CONCURRENT_REQUESTS = 4
+MAX_RETRIES = 6
+# A text-embedding-3-small vector stored as float32 is about 6 KB, so this is roughly 120 MB on disk.
+EMBEDDING_CACHE_ENTRIES = 20_000
+
+
+class _RateLimitGate:
+    '''
+    Shared between the worker threads so that when one request gets a 429, every
+    worker waits out the same window instead of each hammering the API on its own.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._until = 0.0
+
+    def wait(self):
+        with self._lock:
+            delay = self._until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        with self._lock:
+            self._until = max(self._until, time.monotonic() + seconds)
+
+
+def _retry_delay(error, attempt):
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+    return min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def _is_retryable(error):
+    import openai
+
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+class EmbeddingCache:
+    '''
+    Persistent cache of embeddings keyed by model name and a hash of the text, so re-embedding
+    the same page or answering the same question never costs a round trip.
+    '''
+
+    def __init__(self, path=os.path.join(CACHE_DIR, "embeddings.sqlite"), max_entries=EMBEDDING_CACHE_ENTRIES):
+        self.store = SQLiteCache(path, table="embeddings", max_entries=max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model, text):
+        return model + ":" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model, texts):
+        '''Returns {index: embedding} for the texts that are cached.'''
+        keys = [self.key(model, text) for text in texts]
+        found = self.store.get_many(keys)
+        hits = {i: array.array("f", found[key]).tolist() for i, key in enumerate(keys) if key in found}
+        self.hits += len(hits)
+        self.misses += len(texts) - len(hits)
+        return hits
+
+    def set_many(self, model, texts, embeddings):
+        self.store.set_many({
+            self.key(model, text): array.array("f", embedding).tobytes()
+            for text, embedding in zip(texts, embeddings)
+        })
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache()
+        return _default_cache
+
+
+def embed_batch(client, texts, model=EMBEDDING_MODEL, gate=None, max_retries=MAX_RETRIES):
+    '''Embeds one batch in a single request, retrying rate limits and server errors with backoff.'''
+    # The SDK takes most of a second to import, so it is only loaded once something is embedded.
+    import openai
+
+    gate = gate or _RateLimitGate()
+    client = client.with_options(max_retries=0)
+    for attempt in range(max_retries + 1):
+        gate.wait()
+        try:
+            response = client.embeddings.create(input=texts, model=model)
+            return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+        except openai.APIError as e:
+            if attempt == max_retries or not _is_retryable(e):
+                raise
+            delay = _retry_delay(e, attempt)
+            if isinstance(e, openai.RateLimitError):
+                gate.pause(delay)
+            else:
+                time.sleep(delay)
+
+
+def _embed_through_cache(client, texts, model, gate, cache):
+    if not cache:
+        return embed_batch(client, texts, model, gate)
+    found = cache.get_many(model, texts)
+    missing = [i for i in range(len(texts)) if i not in found]
+    if missing:
+        fresh = embed_batch(client, [texts[i] for i in missing], model, gate)
+        cache.set_many(model, [texts[i] for i in missing], fresh)
+        found.update(zip(missing, fresh))
+    return [found[i] for i in range(len(texts))]
+
+
+def embed_stream(client, items, text_of=lambda item: item, model=EMBEDDING_MODEL,
+                 max_workers=MAX_CONCURRENT_REQUESTS, max_tokens=MAX_TOKENS_PER_REQUEST,
+                 max_items=MAX_INPUTS_PER_REQUEST, cache=None):
+    '''
+    Embeds items from any iterable as they arrive, so embedding can start while the producer
+    (e.g. HTML extraction) is still running. Items are packed into token-budgeted batches and a
+    bounded number of requests run at once. Yields (batch_items, embeddings) as batches finish,
+    which is not necessarily input order.
+
+    Texts are read through the embedding cache (the shared on-disk one unless another is
+    passed); cache=False skips it.
+    '''
+    if cache is None:
+        cache = get_embedding_cache()
+    gate = _RateLimitGate()
+    in_flight = {}
+    pending = []
+    pending_tokens = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        def submit(batch):
+            future = pool.submit(_embed_through_cache, client, [text_of(item) for item in batch], model, gate, cache)
+            in_flight[future] = batch
+
+        def drain(block_until_below):
+            while len(in_flight) > block_until_below:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    yield in_flight.pop(future), future.result()
+
+        for item in items:
+            tokens = min(count_tokens(text_of(item), model), MAX_INPUT_TOKENS)
+            if pending and (pending_tokens + tokens > max_tokens or len(pending) >= max_items):
+                submit(pending)
+                pending = []
+                pending_tokens = 0
+                yield from drain(max_workers * 2)
+            pending.append(item)
+            pending_tokens += tokens
+
+        if pending:
+            submit(pending)
+        yield from drain(0)
+
+
+def embed_texts(client, texts, model=EMBEDDING_MODEL, max_workers=MAX_CONCURRENT_REQUESTS,
+                max_tokens=MAX_TOKENS_PER_REQUEST, progress=None, cache=None):
+    '''
+    Embeds a list of texts, packing many into each request and running a few requests at once.
+    Returns embeddings in the same order as the input. progress(done, total) is called as
+    batches finish.
+    '''
+    embeddings = [None] * len(texts)
+    done = 0
+    if current_trace():
+        count("embed_tokens", sum(count_tokens(text, model) for text in texts))
+    with span("embed"):
+        for batch, batch_embeddings in embed_stream(client, range(len(texts)), text_of=lambda i: texts[i],
+                                                    model=model, max_workers=max_workers, max_tokens=max_tokens,
+                                                    cache=cache):
+            for i, embedding in zip(batch, batch_embeddings):
+                embeddings[i] = embedding
+            done += len(batch)
+            if progress:
+                progress(done, len(texts))
+    return embeddings
+
+
+def embed_query(client, text, model=EMBEDDING_MODEL, cache=None):
+    '''Embeds a single query through the cache without spinning up the batching machinery.'''
+    if cache is None:
+        cache = get_embedding_cache()
+    if current_trace():
+        count("embed_tokens", count_tokens(text, model))
+    with span("embed"):
+        return _embed_through_cache(client, [text], model, _RateLimitGate(), cache)[0]
@@ -0,0 +1,148 @@
+'''
+Fetching web pages for the URL pages (HW2, HW3). Every fetch goes through one pooled
+requests.Session, bodies are read in chunks and cut off at a byte cap, and responses are kept
+in a size-bounded on-disk cache. A cached page is revalidated with If-None-Match /
+If-Modified-Since, so an unchanged page costs a 304 rather than a full download.
+'''
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.kv_cache import CACHE_DIR, SQLiteCache
+from utils.tracing import count, in_context, span
+
+FETCH_TIMEOUT = (5, 15)  # (connect, read) seconds
+MAX_PAGE_BYTES = 5 * 1024 * 1024
+CHUNK_BYTES = 64 * 1024
+MAX_CONCURRENT_FETCHES = 8
+HTTP_CACHE_BYTES = 200 * 1024 * 1024
+USER_AGENT = "HowellIST488HW/1.0"
+
+
+@dataclass
+class FetchResult:
+    url: str
+    content: bytes = b""
+    status: Optional[int] = None
+    error: Optional[str] = None
+    from_cache: bool = False
+    truncated: bool = False
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class HttpCache:
+    '''
+    Response bodies plus the validators needed to revalidate them, stored as one blob per URL:
+    a JSON header line followed by the raw body.
+    '''
+
+    def __init__(self, path=os.path.join(CACHE_DIR, "http.sqlite"), max_bytes=HTTP_CACHE_BYTES):
+        self._store = SQLiteCache(path, table="responses", max_entries=5_000, max_bytes=max_bytes)
+
+    def get(self, url):
+        blob = self._store.get(url)
+        if blob is None:
+            return None
+        header, _, body = blob.partition(b"\n")
+        return json.loads(header), body
+
+    def set(self, url, validators, body):
+        self._store.set(url, json.dumps(validators).encode("utf-8") + b"\n" + body)
+
+    def clear(self):
+        self._store.clear()
+
+
+_session = None
+_cache = None
+_setup_lock = threading.Lock()
+
+
+def get_session():
+    '''One Session for the whole process, so repeat fetches to a host reuse its connections.'''
+    global _session
+    with _setup_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=MAX_CONCURRENT_FETCHES)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            _session = session
+        return _session
+
+
+def get_http_cache():
+    global _cache
+    with _setup_lock:
+        if _cache is None:
+            _cache = HttpCache()
+        return _cache
+
+
+def fetch(url, timeout=FETCH_TIMEOUT, max_bytes=MAX_PAGE_BYTES, cache=None):
+    '''
+    Fetches one URL. Never raises: failures come back as FetchResult.error so callers can show
+    them next to pages that did load. cache=None uses the shared HTTP cache, False disables it.
+    '''
+    if cache is None:
+        cache = get_http_cache()
+    cached = cache.get(url) if cache else None
+
+    headers = {}
+    if cached:
+        validators = cached[0]
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    with span("fetch"):
+        try:
+            with get_session().get(url, headers=headers, timeout=timeout, stream=True) as response:
+                if response.status_code == 304 and cached:
+                    return FetchResult(url, cached[1], 304, from_cache=True,
+                                       truncated=cached[0].get("truncated", False))
+                response.raise_for_status()
+
+                declared = int(response.headers.get("Content-Length") or 0)
+                body = bytearray()
+                truncated = declared > max_bytes
+                for chunk in response.iter_content(CHUNK_BYTES):
+                    body += chunk
+                    if len(body) > max_bytes:
+                        truncated = True
+                        del body[max_bytes:]
+                        break
+                validators = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "truncated": truncated,
+                }
+                status = response.status_code
+        except requests.RequestException as e:
+            return FetchResult(url, error=str(e))
+
+    body = bytes(body)
+    count("bytes_fetched", len(body))
+    # Pages without validators can't be revalidated, so caching them would only serve stale copies.
+    if cache and (validators["etag"] or validators["last_modified"]):
+        cache.set(url, validators, body)
+    return FetchResult(url, body, status, truncated=truncated)
+
+
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_FETCHES, thread_name_prefix="fetch")
+
+
+def fetch_many(urls, **kwargs):
+    '''Fetches several URLs at once; results come back in the order of `urls`.'''
+    return list(_executor.map(in_context(lambda url: fetch(url, **kwargs)), urls))
@@ -0,0 +1,326 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils.bm25 import BM25_FILE, save_bm25
+from utils.embeddings import EMBEDDING_MODEL, embed_stream
+from utils.numpy_index import NUMPY_INDEX_DIR, VECTOR_BACKEND, save_numpy_index
+from utils.org_records import org_table_current, parse_org_record, record_text, save_org_records, update_org_records
+from utils.tokens import count_tokens
+from utils.tracing import span
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+logger = logging.getLogger(__name__)
+
+# SU_ORGS_DB_PATH moves the index, e.g. so scripts/cold_start.py never touches the real one.
+DB_PATH = os.environ.get("SU_ORGS_DB_PATH", "./ChromaDB_for_HW4")
+MANIFEST_NAME = "su_orgs_manifest.json"
+COLLECTION_NAME = "StudentOrgsCollection"
+ORGS_FOLDER = "data/HW-04-Data/su_orgs"
+
+# Chroma caps how many records one add/upsert call may carry, so large builds are written in slices.
+WRITE_BATCH_SIZE = 1000
+EXTRACT_WORKERS = min(os.cpu_count() or 1, 8)
+# Bump this whenever extraction or chunking changes so every file is re-chunked on the next sync.
+CHUNKER_VERSION = 4
+CHUNK_TARGET_TOKENS = 300
+CHUNK_OVERLAP_TOKENS = 40
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def extract_text_from_html(file_path, parser=HTML_PARSER):
+    '''
+    Uses lxml when it is installed since it parses these ~50 KB pages several times faster
+    than the pure Python html.parser, which we fall back to otherwise. Text comes back one
+    line per text node with headings marked "## " so the chunker can split on them.
+    '''
+    with open(file_path, "r", encoding="utf-8") as f:
+        return html_to_text(f.read(), parser)
+
+
+def html_to_text(html, parser=HTML_PARSER):
+    from bs4 import BeautifulSoup
+
+    with span("parse"):
+        soup = BeautifulSoup(html, parser)
+        for element in soup(["script", "style"]):
+            element.decompose()
+        for heading in soup(["h1", "h2", "h3", "h4", "h5", "h6"]):
+            heading.replace_with(f"## {heading.get_text(' ', strip=True)}")
+        return soup.get_text(separator="\n", strip=True)
+
+
+def _extract_file(file_path):
+    '''
+    Campuslabs pages carry the organization as JSON; when it is there only the name, summary and
+    cleaned description are embedded, since the rest of the page is navigation shared by every
+    org. Anything else falls back to the page's full text. The record (None for those) is
+    returned too, for the org records table.
+    '''
+    with open(file_path, "r", encoding="utf-8") as f:
+        html = f.read()
+    with span("parse"):
+        record = parse_org_record(html, file_path.name, HTML_PARSER)
+    if record:
+        return file_path, record_text(record), record
+    return file_path, html_to_text(html), None
+
+
+def iter_extracted(html_files, max_workers=EXTRACT_WORKERS):
+    '''
+    Yields (file, text, org record) as soon as each file is parsed. Parsing is CPU bound, so it runs on
+    a process pool; "spawn" keeps the workers clear of the threads Streamlit already has running.
+    '''
+    if max_workers <= 1 or len(html_files) <= 1:
+        for file in html_files:
+            yield _extract_file(file)
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(_extract_file, file) for file in html_files]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def _split_long(segment, max_tokens):
+    '''Breaks a sentence that is longer than a whole chunk into word windows.'''
+    words = segment.split()
+    piece = []
+    for word in words:
+        piece.append(word)
+        if count_tokens(" ".join(piece)) >= max_tokens:
+            yield " ".join(piece)
+            piece = []
+    if piece:
+        yield " ".join(piece)
+
+
+def _segments(text, max_tokens):
+    '''Yields (segment, is_heading) pairs: headings and sentences, never longer than max_tokens.'''
+    for line in text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("## "):
+            yield line, True
+            continue
+        for sentence in SENTENCE_END.split(line):
+            if count_tokens(sentence) > max_tokens:
+                for piece in _split_long(sentence, max_tokens):
+                    yield piece, False
+            else:
+                yield sentence, False
+
+
+def chunk_document(text, filename, target_tokens=CHUNK_TARGET_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    '''
+    Sliding-window chunker. Sentences and lines are packed into chunks of about target_tokens,
+    a new chunk starts early at a heading once the current one is at least a quarter full, and
+    each chunk repeats the last ~overlap_tokens of the previous one so facts that straddle a
+    boundary are still retrievable. Short pages stay a single chunk. Every chunk after the
+    first starts with the page title so it still says which organization it is about.
+    '''
+    with span("chunk"):
+        title = next((line.strip() for line in text.split("\n") if line.strip()), "")
+        segments = [(seg, heading, count_tokens(seg)) for seg, heading in _segments(text, target_tokens)]
+        chunks = []
+        current = []
+        current_tokens = 0
+
+        for segment, heading, tokens in segments:
+            full = current_tokens + tokens > target_tokens
+            at_heading = heading and current_tokens >= target_tokens // 4
+            if current and (full or at_heading):
+                chunks.append(current)
+                # Carry the tail of this chunk over, unless we are starting fresh at a heading.
+                carried = []
+                carried_tokens = 0
+                if not heading:
+                    for prev in reversed(current):
+                        if carried_tokens + prev[2] > overlap_tokens or prev[1]:
+                            break
+                        carried.insert(0, prev)
+                        carried_tokens += prev[2]
+                current = carried
+                current_tokens = carried_tokens
+            current.append((segment, heading, tokens))
+            current_tokens += tokens
+
+        if current:
+            chunks.append(current)
+
+        return [
+            {
+                "text": "\n".join(([title] if i > 1 else []) + [segment for segment, _, _ in chunk]),
+                "id": f"{filename}_chunk{i}",
+                "metadata": {"source": filename, "chunk": i, "chunker_version": CHUNKER_VERSION},
+            }
+            for i, chunk in enumerate(chunks, start=1)
+        ]
+
+
+def _write_chunks(collection, chunks, embeddings):
+    for start in range(0, len(chunks), WRITE_BATCH_SIZE):
+        batch = chunks[start:start + WRITE_BATCH_SIZE]
+        collection.upsert(
+            documents=[chunk["text"] for chunk in batch],
+            embeddings=embeddings[start:start + WRITE_BATCH_SIZE],
+            ids=[chunk["id"] for chunk in batch],
+            metadatas=[chunk["metadata"] for chunk in batch]
+        )
+
+
+def add_chunks_to_collection(collection, chunks, client, progress=None, cache=None):
+    '''
+    Embeds chunks with as few requests as possible and writes each finished batch to Chroma
+    with one upsert. Upsert (rather than add) means re-running a half finished build is safe.
+    chunks can be any iterable, including a generator that is still being filled.
+    '''
+    written = 0
+    for batch, embeddings in embed_stream(client, (chunk for chunk in chunks if chunk["text"]),
+                                          text_of=lambda chunk: chunk["text"], model=EMBEDDING_MODEL, cache=cache):
+        _write_chunks(collection, batch, embeddings)
+        written += len(batch)
+        if progress:
+            progress(written)
+    return written
+
+
+def build_collection(collection, client, html_files, progress=None, cache=None, records=None):
+    '''
+    Streams files through extract -> chunk -> embed -> write, so embedding requests go out while
+    later files are still being parsed. progress(files_done, total_files, chunks_written) lets a
+    caller drive a progress bar. If given, `records` is filled with {file name: org record or None}.
+    '''
+    counts = {"files": 0, "chunks": 0}
+
+    def report():
+        if progress:
+            progress(counts["files"], len(html_files), counts["chunks"])
+
+    def chunks():
+        for file, text, record in iter_extracted(html_files):
+            if records is not None:
+                records[file.name] = record
+            counts["files"] += 1
+            report()
+            yield from chunk_document(text, file.name)
+
+    def on_written(written):
+        counts["chunks"] = written
+        report()
+
+    return add_chunks_to_collection(collection, chunks(), client, progress=on_written, cache=cache)
+
+
+def file_hash(file_path):
+    with open(file_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_manifest(db_path=DB_PATH):
+    try:
+        with open(os.path.join(db_path, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"files": {}}
+
+
+def save_manifest(manifest, db_path=DB_PATH):
+    '''Writes to a temp file and renames it, so a crash mid-write never leaves a corrupt manifest.'''
+    path = os.path.join(db_path, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def index_version(db_path=DB_PATH):
+    '''A short fingerprint of the indexed content; it changes whenever a sync re-embeds or removes anything.'''
+    try:
+        with open(os.path.join(db_path, MANIFEST_NAME), "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()[:16]
+    except FileNotFoundError:
+        return None
+
+
+def sync_collection(collection, client, html_files, db_path=DB_PATH, progress=None, cache=None, export_numpy=None):
+    '''
+    Brings the collection in line with the files on disk using the manifest of content hashes
+    stored next to it. Only new or edited files (or files chunked by an older CHUNKER_VERSION)
+    are re-embedded, and chunks whose source file is gone are deleted.
+
+    The NumPy export is only written when export_numpy is set (by default, when SU_ORGS_BACKEND
+    is numpy); otherwise a leftover one is removed so the index doesn't carry a stale copy.
+    '''
+    if export_numpy is None:
+        export_numpy = VECTOR_BACKEND == "numpy"
+    manifest = load_manifest(db_path)
+    known = manifest["files"]
+    current = {file.name: (file, file_hash(file)) for file in html_files}
+
+    changed = [
+        file for name, (file, digest) in current.items()
+        if known.get(name, {}).get("hash") != digest or known.get(name, {}).get("chunker") != CHUNKER_VERSION
+    ]
+    removed = [name for name in known if name not in current]
+    # Files that were re-chunked or deleted lose their old chunks first, since the chunk count can change.
+    stale = removed + [file.name for file in changed if file.name in known]
+    for start in range(0, len(stale), WRITE_BATCH_SIZE):
+        collection.delete(where={"source": {"$in": stale[start:start + WRITE_BATCH_SIZE]}})
+
+    if not known and collection.count() > 0:
+        # An index built before the manifest existed: we can't tell what's in it, so start over.
+        old_ids = collection.get(include=[])["ids"]
+        for start in range(0, len(old_ids), WRITE_BATCH_SIZE):
+            collection.delete(ids=old_ids[start:start + WRITE_BATCH_SIZE])
+
+    records = {}
+    written = build_collection(collection, client, changed, progress=progress, cache=cache, records=records) if changed else 0
+
+    manifest["files"] = {
+        name: {"hash": digest, "chunker": CHUNKER_VERSION}
+        for name, (file, digest) in current.items()
+    }
+    save_manifest(manifest, db_path)
+    # The lexical and NumPy indexes are rebuilt from the collection whenever anything changed;
+    # neither needs the pages re-parsed.
+    numpy_dir = os.path.join(db_path, NUMPY_INDEX_DIR)
+    derived = [os.path.join(db_path, BM25_FILE)] + ([numpy_dir] if export_numpy else [])
+    if changed or stale or not all(os.path.exists(path) for path in derived):
+        save_bm25(collection, db_path)
+        if export_numpy:
+            save_numpy_index(collection, db_path)
+    if not export_numpy and os.path.isdir(numpy_dir):
+        shutil.rmtree(numpy_dir)
+
+    # The org records table only takes the pages parsed above for embedding. Parsing every page
+    # is the slow part (seconds for the full folder), so that only happens when the table is
+    # missing or was made with other FIELDS.
+    if not org_table_current(db_path):
+        unparsed = [file for file in html_files if file.name not in records]
+        records.update((file.name, record) for file, _, record in iter_extracted(unparsed))
+        save_org_records(records.values(), db_path)
+    elif records or removed:
+        update_org_records(db_path, records, removed)
+
+    summary = {
+        "unchanged": len(current) - len(changed),
+        "reembedded": len(changed),
+        "removed": len(removed),
+        "chunks_written": written,
+    }
+    logger.info(
+        "su_orgs sync: skipped %d unchanged files, re-embedded %d files (%d chunks), removed %d files",
+        summary["unchanged"], summary["reembedded"], written, summary["removed"]
+    )
+    return summary
@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_DIR = os.environ.get("APP_CACHE_DIR", "./.cache")
+
+
+class SQLiteCache:
+    '''
+    A small persistent key-value store. Keys are strings, values are bytes. Once the table holds
+    more than max_entries rows (or, if max_bytes is given, more than max_bytes of values), the
+    least recently used entries are evicted down to 90%. Entries older than ttl seconds (if
+    given) are treated as missing.
+
+    One connection is shared between threads behind a lock; WAL mode lets other processes
+    (a second Streamlit server, the index builder) read while we write.
+    '''
+
+    def __init__(self, path, table="cache", max_entries=10_000, ttl=None, max_bytes=None):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.table = table
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_used ON {table} (last_used)")
+
+    def get_many(self, keys):
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        now = time.time()
+        with self._lock, self._conn:
+            # SQLite limits bound parameters per statement, so look keys up in slices.
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, value, created FROM {self.table} WHERE key IN ({','.join('?' * len(part))})",
+                    part
+                ).fetchall()
+                for key, value, created in rows:
+                    if self.ttl is None or now - created <= self.ttl:
+                        found[key] = value
+            if found:
+                self._conn.executemany(
+                    f"UPDATE {self.table} SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+        return found
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items):
+        if not items:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created, last_used) VALUES (?, ?, ?, ?)",
+                [(key, value, now, now) for key, value in items.items()]
+            )
+            self._evict()
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def delete(self, key):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def _evict(self):
+        if self.ttl is not None:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE created < ?", (time.time() - self.ttl,))
+        count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        if count > self.max_entries:
+            # Evict down to 90% so we aren't running this delete on every insert.
+            excess = count - int(self.max_entries * 0.9)
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+        if self.max_bytes is not None:
+            total = self._conn.execute(f"SELECT COALESCE(SUM(LENGTH(value)), 0) FROM {self.table}").fetchone()[0]
+            if total > self.max_bytes:
+                target = total - int(self.max_bytes * 0.9)
+                freed = 0
+                stale = []
+                for key, size in self._conn.execute(
+                    f"SELECT key, LENGTH(value) FROM {self.table} ORDER BY last_used"
+                ):
+                    stale.append((key,))
+                    freed += size
+                    if freed >= target:
+                        break
+                self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", stale)
@@ -0,0 +1,230 @@
+'''
+One streaming interface over the OpenAI and Anthropic chat APIs (HW2, HW3), with the failure
+handling the bare SDK calls lacked:
+
+  - a deadline per call, covering both the wait for the first token and the whole answer;
+  - retries with jittered backoff on 429s, 5xx and dropped connections, as long as no text
+    has been shown yet (after that a retry would repeat the answer);
+  - optional hedging: if the first token is slower than the p95 we have seen for that model,
+    a backup request goes to another route (a smaller model, or the other provider) and
+    whichever starts streaming first wins. The loser is closed.
+
+Every route's time to first token is tracked so the hedge threshold follows real latency.
+'''
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+
+from utils.embeddings import _retry_delay
+
+CALL_DEADLINE = 60.0
+FIRST_TOKEN_DEADLINE = 20.0
+MAX_RETRIES = 3
+# Until a route has this many samples its hedge threshold is HEDGE_DEFAULT_SECONDS.
+HEDGE_MIN_SAMPLES = 20
+HEDGE_DEFAULT_SECONDS = 3.0
+LATENCY_WINDOW = 200
+
+
+@dataclass(frozen=True)
+class Route:
+    provider: str  # "openai" or "anthropic"
+    model: str
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class LatencyTracker:
+    '''
+    Recent time-to-first-token samples per route. A request cancelled before its first token
+    (the loser of a hedge) is recorded as the time it had waited, a lower bound on its real one.
+    '''
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self.window = window
+
+    def record(self, route, seconds):
+        with self._lock:
+            self._samples.setdefault(route, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, route, q):
+        with self._lock:
+            samples = list(self._samples.get(route, ()))
+        return float(np.percentile(samples, q)) if samples else None
+
+    def hedge_threshold(self, route):
+        with self._lock:
+            enough = len(self._samples.get(route, ())) >= HEDGE_MIN_SAMPLES
+        return self.percentile(route, 95) if enough else HEDGE_DEFAULT_SECONDS
+
+
+latency = LatencyTracker()
+
+
+def is_retryable(error):
+    import anthropic
+    import openai
+
+    if isinstance(error, (openai.APIConnectionError, anthropic.APIConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status == 429 or status >= 500)
+
+
+class LLM:
+    '''Holds the provider clients. Get them from utils.resources so connections are pooled.'''
+
+    def __init__(self, openai_client=None, anthropic_client=None, tracker=latency):
+        self.clients = {"openai": openai_client, "anthropic": anthropic_client}
+        self.tracker = tracker
+
+    def _deltas(self, route, system, messages, max_tokens, timeout, cancelled):
+        client = self.clients[route.provider].with_options(max_retries=0, timeout=timeout)
+        if route.provider == "openai":
+            # No output cap here: GPT-5 models spend part of it on reasoning before any text.
+            stream = client.responses.create(
+                model=route.model,
+                input=([{"role": "system", "content": system}] if system else []) + messages,
+                stream=True,
+            )
+            with stream:
+                for event in stream:
+                    if cancelled.is_set():
+                        return
+                    if event.type == "response.output_text.delta":
+                        yield event.delta
+        else:
+            kwargs = {"system": system} if system else {}
+            with client.messages.stream(model=route.model, max_tokens=max_tokens, messages=messages, **kwargs) as stream:
+                for text in stream.text_stream:
+                    if cancelled.is_set():
+                        return
+                    yield text
+
+    def _run(self, attempt_id, route, system, messages, max_tokens, timeout, cancelled, events):
+        '''Worker thread: streams one request into `events` as (attempt_id, kind, payload).'''
+        try:
+            for delta in self._deltas(route, system, messages, max_tokens, timeout, cancelled):
+                events.put((attempt_id, "delta", delta))
+            events.put((attempt_id, "done", None))
+        except Exception as e:
+            events.put((attempt_id, "error", e))
+
+    def _race(self, routes, system, messages, max_tokens, deadline, first_token_deadline, hedge, on_route=None):
+        '''
+        One try: starts routes[0], and routes[1] too if hedging and the first token is late.
+        Yields the winner's text. Raises the error if every started request fails first.
+        '''
+        events = queue.Queue()
+        cancelled = [threading.Event() for _ in routes]
+        started = []
+        launched_at = {}
+        failed = {}
+        hedge_at = time.monotonic() + self.tracker.hedge_threshold(routes[0]) if hedge and len(routes) > 1 else None
+
+        def launch(i):
+            started.append(i)
+            launched_at[i] = time.monotonic()
+            threading.Thread(
+                target=self._run, daemon=True,
+                args=(i, routes[i], system, messages, max_tokens, deadline - time.monotonic(), cancelled[i], events),
+            ).start()
+
+        launch(0)
+        winner = None
+        try:
+            while winner is None:
+                wait_until = min(first_token_deadline, hedge_at) if hedge_at else first_token_deadline
+                try:
+                    attempt_id, kind, payload = events.get(timeout=max(0.0, wait_until - time.monotonic()))
+                except queue.Empty:
+                    if hedge_at and len(started) == 1:
+                        launch(1)
+                        hedge_at = None
+                        continue
+                    raise DeadlineExceeded(f"No response from {routes[0].model} within the deadline")
+
+                if kind == "error":
+                    failed[attempt_id] = payload
+                    if len(failed) == len(started):
+                        if hedge_at and len(started) == 1 and is_retryable(payload):
+                            # The primary failed before we hedged; try the backup right away.
+                            launch(1)
+                            hedge_at = None
+                            continue
+                        raise payload
+                    continue
+
+                winner = attempt_id
+                now = time.monotonic()
+                self.tracker.record(routes[winner], now - launched_at[winner])
+                for i in started:
+                    if i != winner:
+                        cancelled[i].set()
+                        if i not in failed:
+                            # Censored: its first token would have come later than this. Dropping
+                            # the slow requests we hedged away would pull the p95 down, and with
+                            # it the threshold, so hedging would feed on itself.
+                            self.tracker.record(routes[i], now - launched_at[i])
+                if on_route:
+                    on_route(routes[winner])
+                if kind == "done":
+                    return
+                yield payload
+
+            while True:
+                try:
+                    attempt_id, kind, payload = events.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    raise DeadlineExceeded(f"{routes[winner].model} did not finish within the deadline")
+                if attempt_id != winner:
+                    continue
+                if kind == "delta":
+                    yield payload
+                elif kind == "done":
+                    return
+                else:
+                    raise payload
+        finally:
+            for event in cancelled:
+                event.set()
+
+    def stream(self, route: Route, messages: list, system: Optional[str] = None, max_tokens: int = 1024,
+               deadline: float = CALL_DEADLINE, first_token_deadline: float = FIRST_TOKEN_DEADLINE,
+               fallback: Optional[Route] = None, hedge: bool = False, max_retries: int = MAX_RETRIES,
+               on_route: Optional[Callable[[Route], None]] = None) -> Iterator[str]:
+        '''
+        Yields text deltas for `messages` (user/assistant role dicts; the system prompt goes in
+        `system`). max_tokens applies to Anthropic, which requires one. With hedge=True,
+        `fallback` gets a backup request once the first token is slower than the route's p95.
+        `on_route` is called with the route whose answer is being streamed once it starts, so
+        callers can tell a fallback answer from one by `route`. Raises DeadlineExceeded or the
+        provider's error when retries run out.
+        '''
+        routes = [route] + ([fallback] if fallback else [])
+        start = time.monotonic()
+        call_deadline = start + deadline
+        for attempt in range(max_retries + 1):
+            yielded = False
+            try:
+                for delta in self._race(routes, system, messages, max_tokens, call_deadline,
+                                        min(call_deadline, time.monotonic() + first_token_deadline), hedge, on_route):
+                    yielded = True
+                    yield delta
+                return
+            except Exception as e:
+                if yielded or attempt == max_retries or not (is_retryable(e) or isinstance(e, DeadlineExceeded)):
+                    raise
+                delay = _retry_delay(e, attempt)
+                if time.monotonic() + delay >= call_deadline:
+                    raise
+                time.sleep(delay)
@@ -0,0 +1,235 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+NUMPY_INDEX_DIR = "numpy_index"
+VECTORS_FILE = "vectors.npy"
+RECORDS_FILE = "records.json"
+# Names the generation directory holding the current vectors and records; see save_numpy_index.
+CURRENT_FILE = "CURRENT"
+
+# Set SU_ORGS_BACKEND=numpy to search an exported copy of the Chroma vectors with NumPy. Only
+# then does a sync export it, and only this backend uses the quantization settings below.
+VECTOR_BACKEND = os.environ.get("SU_ORGS_BACKEND", "chroma")
+# Optional compact copy used for the first search pass: "float16", "int8" or "none", optionally
+# truncated to the first SU_ORGS_DIMENSIONS dimensions.
+QUANTIZE = os.environ.get("SU_ORGS_QUANTIZE", "none")
+DIMENSIONS = int(os.environ.get("SU_ORGS_DIMENSIONS", "0")) or None
+RESCORE_CANDIDATES = 50
+
+
+def quantize(vectors, dtype, dimensions=None):
+    '''
+    text-embedding-3 vectors can be shortened by keeping a prefix and re-normalizing; that is what
+    the API's `dimensions` parameter does server side. Doing it here instead keeps the full vectors
+    (and the embedding cache) valid for rescoring. Returns (compact, scales); scales is only set
+    for int8, where each row is stored as round(v / scale) with scale = max|v| / 127.
+    '''
+    vectors = np.asarray(vectors[:, :dimensions] if dimensions else vectors, dtype=np.float32)
+    vectors = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1, initial=0) / 127.0 + 1e-12
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    raise ValueError(f"Unknown quantization {dtype!r}; use float16, int8 or none")
+
+
+class NumpyIndex:
+    '''
+    Exact nearest-neighbour search over a memory-mapped float32 matrix. Row i of the matrix goes
+    with ids[i], documents[i] and metadatas[i]. Rows are L2-normalized when saved, so top-k is one
+    matrix-vector product plus argpartition. count() and query() mirror the Chroma collection
+    methods the pages use, so it can stand in for the collection.
+
+    With quantization on, only a compact (truncated and/or float16/int8) copy is held in memory.
+    It picks RESCORE_CANDIDATES rows, and just those rows are read from the full float32 file
+    to rescore, which keeps the ranking of the top results essentially exact.
+    '''
+
+    def __init__(self, path, quantization=QUANTIZE, dimensions=DIMENSIONS):
+        self.path = path
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        with open(os.path.join(path, RECORDS_FILE), "r", encoding="utf-8") as f:
+            records = json.load(f)
+        self.ids = records["ids"]
+        self.documents = records["documents"]
+        self.metadatas = records["metadatas"]
+
+        self.quantization = quantization
+        self.dimensions = dimensions
+        self.compact = None
+        self.scales = None
+        if quantization != "none":
+            self._load_compact()
+
+    def _load_compact(self):
+        compact_path, scales_path = _compact_paths(self.path, self.quantization, self.dimensions)
+        if os.path.exists(compact_path):
+            self.compact = np.load(compact_path)
+            self.scales = np.load(scales_path) if self.quantization == "int8" else None
+        else:
+            # Exported with other settings: build the copy in memory rather than writing into a
+            # generation other processes may be reading.
+            self.compact, self.scales = quantize(self.vectors, self.quantization, self.dimensions)
+
+    def memory_bytes(self):
+        '''Bytes of vector data a query scans: the compact copy if there is one, else the full matrix.'''
+        if self.compact is None:
+            return self.vectors.nbytes
+        return self.compact.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def count(self):
+        return len(self.ids)
+
+    def get(self, include=("documents", "metadatas")):
+        return {"ids": self.ids, "documents": self.documents, "metadatas": self.metadatas}
+
+    def _top(self, scores, k):
+        if k >= len(scores):
+            return np.argsort(-scores)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def search(self, query, k, rescore=True):
+        '''Returns (rows, similarities) for one normalized float32 query vector, best first.'''
+        if self.compact is None:
+            scores = self.vectors @ query
+            top = self._top(scores, k)
+            return top, scores[top]
+
+        short_query = query[:self.dimensions] if self.dimensions else query
+        short_query = short_query / (np.linalg.norm(short_query) + 1e-12)
+        # Widen to float32 a block at a time rather than materializing a full float32 copy.
+        approx = np.empty(len(self.compact), dtype=np.float32)
+        for start in range(0, len(self.compact), 4096):
+            approx[start:start + 4096] = self.compact[start:start + 4096].astype(np.float32) @ short_query
+        if self.scales is not None:
+            approx *= self.scales
+        candidates = self._top(approx, max(k, RESCORE_CANDIDATES) if rescore else k)
+        if not rescore:
+            return candidates[:k], approx[candidates[:k]]
+
+        # Sorted row order keeps the reads from the memory-mapped full matrix sequential.
+        candidates = np.sort(candidates)
+        exact = self.vectors[candidates] @ query
+        order = np.argsort(-exact)[:k]
+        return candidates[order], exact[order]
+
+    def query(self, query_embeddings, n_results=10, **kwargs):
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True) + 1e-12
+        k = min(n_results, len(self.ids))
+
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query in queries:
+            if not k:
+                for key in results:
+                    results[key].append([])
+                continue
+            top, similarities = self.search(query, k)
+            results["ids"].append([self.ids[i] for i in top])
+            results["documents"].append([self.documents[i] for i in top])
+            results["metadatas"].append([self.metadatas[i] for i in top])
+            results["distances"].append([float(1.0 - s) for s in similarities])
+        return results
+
+    @staticmethod
+    def save(path, ids, documents, metadatas, embeddings, quantization=QUANTIZE, dimensions=DIMENSIONS):
+        '''Writes the full vectors and records, plus the compact copy for the given settings.'''
+        os.makedirs(path, exist_ok=True)
+        if ids:
+            vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        else:
+            vectors = np.zeros((0, 0), dtype=np.float32)
+        np.save(os.path.join(path, VECTORS_FILE), vectors)
+        with open(os.path.join(path, RECORDS_FILE), "w", encoding="utf-8") as f:
+            json.dump({"ids": ids, "documents": documents, "metadatas": metadatas}, f)
+
+        if quantization != "none":
+            compact, scales = quantize(vectors, quantization, dimensions)
+            compact_path, scales_path = _compact_paths(path, quantization, dimensions)
+            np.save(compact_path, compact)
+            if scales is not None:
+                np.save(scales_path, scales)
+
+
+def _compact_paths(path, quantization, dimensions):
+    name = f"vectors_{quantization}_{dimensions or 'full'}"
+    return os.path.join(path, name + ".npy"), os.path.join(path, name + "_scales.npy")
+
+
+def current_generation(index_dir):
+    '''Directory holding the current vectors and records, or None if nothing has been saved.'''
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return os.path.join(index_dir, f.read().strip())
+    except FileNotFoundError:
+        # Indexes saved before generations existed keep their files at the top level.
+        return index_dir if os.path.exists(os.path.join(index_dir, RECORDS_FILE)) else None
+
+
+def save_numpy_index(collection, db_path):
+    '''
+    Exports the vectors already stored in Chroma, so building this backend costs no embedding calls.
+    The compact copy for SU_ORGS_QUANTIZE/SU_ORGS_DIMENSIONS is written here too, at build time.
+
+    Each export goes into a fresh generation directory and only becomes visible when CURRENT is
+    swapped to name it (one atomic rename), so a reader always gets vectors and records from
+    the same export. The generation it replaced is kept for readers that had just read
+    CURRENT; anything older is removed (a process with one memory-mapped keeps reading it).
+    '''
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    index_dir = os.path.join(db_path, NUMPY_INDEX_DIR)
+    os.makedirs(index_dir, exist_ok=True)
+    previous = current_generation(index_dir)
+    generation = tempfile.mkdtemp(prefix="g-", dir=index_dir)
+    NumpyIndex.save(generation, data["ids"], data["documents"], data["metadatas"], data["embeddings"])
+
+    pointer = os.path.join(index_dir, CURRENT_FILE + ".tmp")
+    with open(pointer, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(generation))
+    os.replace(pointer, os.path.join(index_dir, CURRENT_FILE))
+
+    for name in os.listdir(index_dir):
+        old = os.path.join(index_dir, name)
+        if old in (generation, previous) or name == CURRENT_FILE:
+            continue
+        if os.path.isdir(old):
+            shutil.rmtree(old, ignore_errors=True)
+        elif previous != index_dir:
+            # Top-level files from before generations existed, once nothing can be reading them.
+            os.remove(old)
+
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def unload_numpy_index(db_path):
+    with _loaded_lock:
+        _loaded.pop(os.path.join(db_path, NUMPY_INDEX_DIR), None)
+
+
+def load_numpy_index(db_path):
+    '''Returns the index for db_path, reopening it only when a new export has been saved.'''
+    path = os.path.join(db_path, NUMPY_INDEX_DIR)
+    with _loaded_lock:
+        for attempt in range(3):
+            generation = current_generation(path)
+            if generation is None:
+                return None
+            if path in _loaded and _loaded[path][0] == generation:
+                return _loaded[path][1]
+            try:
+                _loaded[path] = (generation, NumpyIndex(generation))
+                return _loaded[path][1]
+            except FileNotFoundError:
+                # Two more exports landed while we were opening this one; CURRENT names a newer one.
+                if attempt == 2:
+                    raise
@@ -0,0 +1,94 @@
+'''
+Per-question passage retrieval over pages fetched at runtime (HW3). Each page is chunked,
+embedded and BM25-indexed once; the index is kept in memory keyed by URL and a hash of the
+page text, so a reload of an unchanged page (or a second session on the same URL) reuses it.
+For each question the best passages across all pages are packed into a token budget.
+'''
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.bm25 import BM25Index
+from utils.embeddings import embed_query, embed_texts
+from utils.ingest import chunk_document
+from utils.retrieval import reciprocal_rank_fusion
+from utils.tokens import count_tokens
+
+PASSAGE_TARGET_TOKENS = 200
+PASSAGE_OVERLAP_TOKENS = 30
+CONTEXT_TOKEN_BUDGET = 1500
+MAX_CACHED_PAGES = 32
+
+
+class PageIndex:
+    def __init__(self, url, passages, embeddings):
+        self.url = url
+        self.passages = passages
+        self.bm25 = BM25Index(list(range(len(passages))), passages, [{"source": url}] * len(passages))
+        if not passages:
+            # A page with no text (script-only, empty response) just contributes nothing.
+            self.vectors = np.zeros((0, 0), dtype=np.float32)
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(passages), -1)
+        self.vectors = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def index_page(client, url, text):
+    '''Returns the PageIndex for this exact page text, building it only the first time.'''
+    key = (url, content_hash(text))
+    with _indexes_lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            return _indexes[key]
+
+    passages = [chunk["text"] for chunk in chunk_document(text, url, PASSAGE_TARGET_TOKENS, PASSAGE_OVERLAP_TOKENS)]
+    index = PageIndex(url, passages, embed_texts(client, passages) if passages else [])
+
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > MAX_CACHED_PAGES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def select_passages(client, indexes, question, budget=CONTEXT_TOKEN_BUDGET):
+    '''
+    Ranks every passage of every page against the question (vector and BM25 rankings merged with
+    reciprocal rank fusion) and keeps the best ones that fit in `budget` tokens. Returns
+    (url, passage) pairs in page order, so the model reads them as they appear on the page.
+    '''
+    indexes = [index for index in indexes if index.passages]
+    keys = [(page, i) for page, index in enumerate(indexes) for i in range(len(index.passages))]
+    if not keys:
+        return []
+
+    query = np.asarray(embed_query(client, question), dtype=np.float32)
+    query /= np.linalg.norm(query) + 1e-12
+    scores = np.concatenate([index.vectors @ query for index in indexes])
+    vector_ranking = [keys[i] for i in np.argsort(-scores)]
+
+    lexical = [((page, position), score)
+               for page, index in enumerate(indexes)
+               for position, score in index.bm25.search(question, k=len(index.passages))]
+    lexical_ranking = [key for key, _ in sorted(lexical, key=lambda item: item[1], reverse=True)]
+
+    chosen = []
+    used = 0
+    for page, i in reciprocal_rank_fusion([vector_ranking, lexical_ranking]):
+        tokens = count_tokens(indexes[page].passages[i])
+        if used + tokens > budget:
+            continue
+        chosen.append((page, i))
+        used += tokens
+
+    return [(indexes[page].url, indexes[page].passages[i]) for page, i in sorted(chosen)]
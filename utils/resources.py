@@ -0,0 +1,177 @@
+'''
+Process-wide handles shared by every Streamlit session: API clients (each one keeps its own
+pooled HTTP connections) and the su_orgs Chroma collection. st.cache_resource hands every
+session the same client instead of building a new one per session or per rerun.
+
+Collections are kept per index directory in a dict of our own rather than st.cache_resource,
+because they have to be let go of: once CURRENT moves to a new snapshot, the old snapshot's
+handle is retired and closed after RETIRE_GRACE_SECONDS (time for questions already running
+against it to finish), along with its cached BM25 and NumPy indexes.
+
+The SDKs and chromadb take a few seconds to import between them, so each is imported inside
+the function that needs it; utils.warmup calls these on a background thread at startup.
+'''
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import streamlit as st
+
+from utils.ingest import COLLECTION_NAME, DB_PATH, ORGS_FOLDER, index_version, sync_collection
+from utils.bm25 import unload_bm25
+from utils.numpy_index import VECTOR_BACKEND, load_numpy_index, unload_numpy_index
+from utils.snapshots import current_snapshot
+
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=16)
+# Set SU_ORGS_BUILD_ON_REQUEST=0 in production so the app only ever serves snapshots made by
+# scripts/build_index.py and never embeds anything while a user is waiting.
+BUILD_ON_REQUEST = os.environ.get("SU_ORGS_BUILD_ON_REQUEST", "1") != "0"
+
+RETIRE_GRACE_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+_sync_lock = threading.Lock()
+_sync_summaries = {}
+_handles_lock = threading.Lock()
+_handles = {}
+_retired = []
+_serving = None
+_missing_exports = set()
+
+
+@st.cache_resource(show_spinner=False)
+def _openai_http_client():
+    from openai import DefaultHttpxClient
+
+    return DefaultHttpxClient(limits=HTTP_LIMITS)
+
+
+@st.cache_resource(show_spinner=False)
+def _anthropic_http_client():
+    from anthropic import DefaultHttpxClient as AnthropicHttpxClient
+
+    return AnthropicHttpxClient(limits=HTTP_LIMITS)
+
+
+@st.cache_resource(show_spinner=False)
+def _shared_openai_client():
+    from openai import OpenAI
+
+    return OpenAI(api_key=st.secrets["EddieOpenAPIKey"], http_client=_openai_http_client())
+
+
+@st.cache_resource(show_spinner=False)
+def _shared_anthropic_client():
+    from anthropic import Anthropic
+
+    return Anthropic(api_key=st.secrets["EddieClaudeAPIKey"], http_client=_anthropic_http_client())
+
+
+def get_openai_client(api_key=None):
+    '''
+    The shared client for the app's key. With `api_key` (HW1's visitor-supplied key) a fresh client
+    is built on the same connection pool instead: caching it would keep one entry, and the key,
+    per distinct key anyone ever typed.
+    '''
+    if not api_key:
+        return _shared_openai_client()
+    from openai import OpenAI
+
+    return OpenAI(api_key=api_key, http_client=_openai_http_client())
+
+
+def get_anthropic_client(api_key=None):
+    '''Same as get_openai_client, for Anthropic.'''
+    if not api_key:
+        return _shared_anthropic_client()
+    from anthropic import Anthropic
+
+    return Anthropic(api_key=api_key, http_client=_anthropic_http_client())
+
+
+def _open_collection(db_path):
+    with _handles_lock:
+        if db_path not in _handles:
+            import chromadb
+
+            client = chromadb.PersistentClient(path=db_path)
+            _handles[db_path] = (client, client.get_or_create_collection(COLLECTION_NAME))
+        return _handles[db_path][1]
+
+
+def _retire_old_snapshots(current):
+    '''Called on every get_collection: notices CURRENT moving and closes handles retired long enough ago.'''
+    global _serving
+    now = time.monotonic()
+    with _handles_lock:
+        if _serving is not None and _serving != current:
+            _retired.append((now, _serving))
+        _serving = current
+        due = [path for retired_at, path in _retired if now - retired_at >= RETIRE_GRACE_SECONDS and path != current]
+        _retired[:] = [(retired_at, path) for retired_at, path in _retired if path not in due]
+        closing = [_handles.pop(path) for path in due if path in _handles]
+    for path in due:
+        unload_bm25(path)
+        unload_numpy_index(path)
+    for client, _ in closing:
+        client.close()
+
+
+def active_db_path(root=DB_PATH):
+    return current_snapshot(root) or root
+
+
+def current_index_version(root=DB_PATH):
+    return index_version(active_db_path(root))
+
+
+def get_collection(root=DB_PATH, progress=None):
+    '''
+    Returns (collection, sync_summary). When a snapshot has been published we serve it as is
+    (summary is None) and pick up a newer one on the next call, no restart needed.
+
+    Without a snapshot we fall back to syncing the index in place under root. The first caller
+    in the process does the sync; anyone arriving meanwhile (say HW4 and HW5 opened at the same
+    time) waits on the lock and then reuses that result instead of building the same index twice.
+    '''
+    snapshot = current_snapshot(root)
+    _retire_old_snapshots(snapshot)
+    if snapshot:
+        return _serve(snapshot), None
+
+    if not BUILD_ON_REQUEST:
+        raise RuntimeError("No su_orgs index snapshot found. Build one with: python -m scripts.build_index")
+
+    collection = _open_collection(root)
+    with _sync_lock:
+        if root not in _sync_summaries:
+            html_files = list(Path(ORGS_FOLDER).glob("*.html"))
+            if html_files:
+                _sync_summaries[root] = sync_collection(
+                    collection, get_openai_client(), html_files, db_path=root, progress=progress
+                )
+            else:
+                _sync_summaries[root] = None
+    return _serve(root), _sync_summaries[root]
+
+
+def _serve(db_path):
+    '''The object pages query: the Chroma collection, or the NumPy index when that backend is selected.'''
+    if VECTOR_BACKEND != "numpy":
+        return _open_collection(db_path)
+    index = load_numpy_index(db_path)
+    if index is None:
+        # A snapshot built with the Chroma backend has no export, and a published snapshot is
+        # never written to, so serve Chroma until one is built with this backend.
+        if db_path not in _missing_exports:
+            _missing_exports.add(db_path)
+            logger.warning(
+                "No NumPy index in %s; serving Chroma. Rebuild with SU_ORGS_BACKEND=numpy python -m scripts.build_index",
+                db_path,
+            )
+        return _open_collection(db_path)
+    return index
@@ -0,0 +1,117 @@
+from utils.bm25 import load_bm25
+from utils.embeddings import embed_query, embed_texts
+from utils.org_records import named_orgs
+from utils.tracing import span
+
+# The lexical answer is used alone when the question names exactly one organization (full or
+# short name, from the org records table) and BM25 ranks that organization first, e.g. "Alpha
+# Phi Omega contact". Otherwise its best chunk has to beat the best chunk from any *other*
+# organization by this factor, e.g. "What does AIAA do?" lands squarely on one page.
+DECISIVE_RATIO = 1.6
+DECISIVE_MIN_SCORE = 8.0
+RRF_K = 60
+CANDIDATES = 20
+
+
+def _as_results(ids, documents, metadatas, mode):
+    '''Shapes results like collection.query() output so callers don't care where they came from.'''
+    return {"ids": [ids], "documents": [documents], "metadatas": [metadatas], "mode": mode}
+
+
+def lexical_is_decisive(bm25, hits, query=None, db_path=None):
+    if not hits:
+        return False
+    top_source = bm25.metadatas[hits[0][0]]["source"]
+    if query and db_path and named_orgs(db_path, query) == {top_source}:
+        return True
+    if hits[0][1] < DECISIVE_MIN_SCORE:
+        return False
+    runner_up = next((score for position, score in hits if bm25.metadatas[position]["source"] != top_source), 0.0)
+    return hits[0][1] >= DECISIVE_RATIO * runner_up
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def _fuse(bm25, hits, vector_ids, vector_documents, vector_metadatas, n_results):
+    if not hits:
+        return _as_results(vector_ids[:n_results], vector_documents[:n_results], vector_metadatas[:n_results], "vector")
+
+    records = {}
+    for i, chunk_id in enumerate(vector_ids):
+        records[chunk_id] = (vector_documents[i], vector_metadatas[i])
+    for position, _ in hits:
+        records.setdefault(bm25.ids[position], (bm25.documents[position], bm25.metadatas[position]))
+
+    fused = reciprocal_rank_fusion([vector_ids, [bm25.ids[p] for p, _ in hits]])[:n_results]
+    return _as_results(fused, [records[i][0] for i in fused], [records[i][1] for i in fused], "hybrid")
+
+
+def retrieve_many(collection, client, queries, n_results=3, db_path=None):
+    '''
+    Hybrid retrieval for several queries at once, e.g. all the tool calls from one model turn.
+    Queries the BM25 index settles on its own cost nothing remote; the rest share a single
+    embeddings request and a single batched collection.query(). n_results may be an int or a
+    list with one value per query.
+    '''
+    if isinstance(n_results, int):
+        n_results = [n_results] * len(queries)
+    bm25 = load_bm25(db_path) if db_path else None
+
+    results = [None] * len(queries)
+    pending = []
+    with span("lexical_query"):
+        for i, query in enumerate(queries):
+            hits = bm25.search(query, k=CANDIDATES) if bm25 else []
+            if bm25 and lexical_is_decisive(bm25, hits, query, db_path):
+                top = [position for position, _ in hits[:n_results[i]]]
+                results[i] = _as_results(
+                    [bm25.ids[p] for p in top], [bm25.documents[p] for p in top], [bm25.metadatas[p] for p in top],
+                    "lexical"
+                )
+            else:
+                pending.append((i, hits))
+
+    if pending:
+        texts = [queries[i] for i, _ in pending]
+        embeddings = [embed_query(client, texts[0])] if len(texts) == 1 else embed_texts(client, texts)
+        with span("vector_query"):
+            vector = collection.query(
+                query_embeddings=embeddings,
+                n_results=max(max(n_results[i] for i, _ in pending), CANDIDATES if bm25 else 0)
+            )
+        for row, (i, hits) in enumerate(pending):
+            results[i] = _fuse(
+                bm25, hits, vector["ids"][row], vector["documents"][row], vector["metadatas"][row], n_results[i]
+            )
+
+    return results
+
+
+def lexical_only(query, n_results=3, db_path=None):
+    '''Results from the BM25 index alone if its match is decisive, else None. Purely local.'''
+    bm25 = load_bm25(db_path) if db_path else None
+    if not bm25:
+        return None
+    with span("lexical_query"):
+        hits = bm25.search(query, k=CANDIDATES)
+    if not lexical_is_decisive(bm25, hits, query, db_path):
+        return None
+    top = [position for position, _ in hits[:n_results]]
+    return _as_results(
+        [bm25.ids[p] for p in top], [bm25.documents[p] for p in top], [bm25.metadatas[p] for p in top], "lexical"
+    )
+
+
+def retrieve(collection, client, query, n_results=3, db_path=None):
+    '''
+    Hybrid retrieval. The BM25 index saved next to the vector store answers on its own when the
+    lexical match is decisive, which skips the embedding call entirely. Otherwise both rankings
+    are merged with reciprocal rank fusion. results["mode"] says which path was taken.
+    '''
+    return retrieve_many(collection, client, [query], [n_results], db_path)[0]
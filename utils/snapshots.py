@@ -0,0 +1,115 @@
+'''
+Versioned, build-once copies of the su_orgs index.
+
+    ChromaDB_for_HW4/
+        snapshots/20261018-141500-123456-k3j9x1/   <- Chroma files, manifest, and a COMPLETE marker
+        snapshots/20261019-090000-654321-a8d2qe/
+        CURRENT                                    <- name of the snapshot the app should serve
+
+A build always writes into a fresh directory and only flips CURRENT (with an atomic rename)
+once the snapshot is complete, so a running app never sees a half built index. Directory
+names are created with mkdtemp, so two builds started in the same second don't collide.
+
+Old snapshots are only deleted once they have been superseded for RETIRE_GRACE_SECONDS,
+giving running apps time to move to the new one and close their handles (see
+utils.resources). Builds that fail remove their directory; ones that died without getting
+the chance are swept by the next build once they are INCOMPLETE_MAX_AGE old.
+'''
+import logging
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from utils.ingest import COLLECTION_NAME, DB_PATH, ORGS_FOLDER, sync_collection
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = "snapshots"
+CURRENT_FILE = "CURRENT"
+COMPLETE_MARKER = "COMPLETE"
+KEEP_SNAPSHOTS = 3
+RETIRE_GRACE_SECONDS = 15 * 60
+INCOMPLETE_MAX_AGE = 6 * 60 * 60
+
+
+def _snapshots(root):
+    folder = Path(root, SNAPSHOT_DIR)
+    if not folder.is_dir():
+        return []
+    return sorted(p for p in folder.iterdir() if (p / COMPLETE_MARKER).exists())
+
+
+def current_snapshot(root=DB_PATH):
+    '''Path of the snapshot named in CURRENT, or the newest complete one, or None if there are none.'''
+    try:
+        name = Path(root, CURRENT_FILE).read_text(encoding="utf-8").strip()
+        path = Path(root, SNAPSHOT_DIR, name)
+        if (path / COMPLETE_MARKER).exists():
+            return str(path)
+    except FileNotFoundError:
+        pass
+    snapshots = _snapshots(root)
+    return str(snapshots[-1]) if snapshots else None
+
+
+def _sweep(root, keep):
+    folder = Path(root, SNAPSHOT_DIR)
+    now = time.time()
+    for path in folder.iterdir():
+        if path.is_dir() and not (path / COMPLETE_MARKER).exists() and now - path.stat().st_mtime > INCOMPLETE_MAX_AGE:
+            logger.info("Removing abandoned snapshot build %s", path.name)
+            shutil.rmtree(path, ignore_errors=True)
+
+    # A snapshot stopped being served when the one after it completed.
+    complete = _snapshots(root)
+    for old, successor in zip(complete[:-keep], complete[1:]):
+        if now - (successor / COMPLETE_MARKER).stat().st_mtime >= RETIRE_GRACE_SECONDS:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def publish_snapshot(path, root=DB_PATH):
+    tmp = Path(root, CURRENT_FILE + ".tmp")
+    tmp.write_text(Path(path).name, encoding="utf-8")
+    os.replace(tmp, Path(root, CURRENT_FILE))
+
+
+def build_snapshot(client, root=DB_PATH, folder=ORGS_FOLDER, keep=KEEP_SNAPSHOTS, progress=None):
+    '''
+    Builds a new snapshot and makes it current. The previous snapshot is copied first, so the
+    build goes through sync_collection and only re-embeds files that changed since then.
+    Returns (snapshot_path, sync_summary).
+    '''
+    html_files = sorted(Path(folder).glob("*.html"))
+    if not html_files:
+        raise FileNotFoundError(f"No HTML files found in {folder}")
+
+    Path(root, SNAPSHOT_DIR).mkdir(parents=True, exist_ok=True)
+    # Microseconds keep names in build order; mkdtemp's suffix makes them unique.
+    started = time.time()
+    prefix = time.strftime("%Y%m%d-%H%M%S", time.localtime(started)) + f"-{int(started * 1e6) % 1_000_000:06d}-"
+    path = Path(tempfile.mkdtemp(prefix=prefix, dir=Path(root, SNAPSHOT_DIR)))
+    previous = current_snapshot(root)
+
+    import chromadb
+
+    try:
+        if previous:
+            shutil.copytree(previous, path, ignore=shutil.ignore_patterns(COMPLETE_MARKER), dirs_exist_ok=True)
+        chroma_client = chromadb.PersistentClient(path=str(path))
+        try:
+            collection = chroma_client.get_or_create_collection(COLLECTION_NAME)
+            summary = sync_collection(collection, client, html_files, db_path=str(path), progress=progress)
+            summary["chunks"] = collection.count()
+        finally:
+            chroma_client.close()
+    except BaseException:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+
+    (path / COMPLETE_MARKER).write_text(time.strftime("%Y-%m-%dT%H:%M:%S"), encoding="utf-8")
+    publish_snapshot(path, root)
+    logger.info("Published su_orgs snapshot %s (%d chunks)", path.name, summary["chunks"])
+    _sweep(root, keep)
+    return str(path), summary
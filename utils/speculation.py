@@ -0,0 +1,69 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.bm25 import tokenize
+from utils.tracing import in_context
+
+# Shared by every session; prefetches are short I/O-bound jobs.
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="prefetch")
+
+EQUIVALENCE_THRESHOLD = 0.8
+
+
+def prefetch(fn, *args, **kwargs):
+    return _executor.submit(in_context(fn), *args, **kwargs)
+
+
+def queries_equivalent(a, b, threshold=EQUIVALENCE_THRESHOLD):
+    '''
+    True when the query the model asked the tool for is close enough to the raw question that
+    the results we prefetched for the question answer it too. Compares content words, so
+    "Tell me about the Bee Club" and "Bee Club" match while "Bee Club meeting times" doesn't.
+    '''
+    words_a = set(tokenize(a))
+    words_b = set(tokenize(b))
+    if not words_a or not words_b:
+        return words_a == words_b
+    return len(words_a & words_b) / len(words_a | words_b) >= threshold
+
+
+class PathStats:
+    '''Latency (time to first token and total) and counts for each way a question was answered.'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def record(self, path, ttft, total):
+        with self._lock:
+            self._samples.setdefault(path, []).append((ttft, total))
+
+    def summary(self):
+        with self._lock:
+            samples = {path: list(values) for path, values in self._samples.items()}
+        count = sum(len(values) for values in samples.values())
+        rows = {}
+        for path, values in sorted(samples.items()):
+            ttfts = [ttft for ttft, _ in values if ttft is not None]
+            rows[path] = {
+                "count": len(values),
+                "share": len(values) / count,
+                "ttft_p50": float(np.percentile(ttfts, 50)) if ttfts else None,
+                "total_p50": float(np.percentile([total for _, total in values], 50)),
+            }
+        hits = rows.get("prefetch_hit", {}).get("count", 0)
+        misses = rows.get("prefetch_miss", {}).get("count", 0)
+        return rows, (hits / (hits + misses) if hits + misses else None)
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def get_path_stats(name):
+    with _stats_lock:
+        if name not in _stats:
+            _stats[name] = PathStats()
+        return _stats[name]
@@ -0,0 +1,36 @@
+'''
+Persistent cache of HW2 summaries. A summary is reused when the page text, summary style,
+language and model are all the same, so rerunning the page (or reopening it later) doesn't
+pay for the same completion twice.
+'''
+import hashlib
+import os
+import re
+import threading
+
+from utils.kv_cache import CACHE_DIR, SQLiteCache
+
+SUMMARY_CACHE_TTL = 7 * 24 * 60 * 60
+SUMMARY_CACHE_ENTRIES = 2_000
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_summary_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SQLiteCache(os.path.join(CACHE_DIR, "summaries.sqlite"), table="summaries",
+                                 max_entries=SUMMARY_CACHE_ENTRIES, ttl=SUMMARY_CACHE_TTL)
+        return _cache
+
+
+def summary_key(document, style, language, model):
+    content_hash = hashlib.sha256(document.encode("utf-8")).hexdigest()
+    return f"{content_hash}:{style}:{language}:{model}"
+
+
+def replay(text):
+    '''Yields a cached summary a word at a time, so st.write_stream renders it like a live answer.'''
+    yield from re.findall(r"\S+\s*|\s+", text)
@@ -0,0 +1,23 @@
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+_encodings = {}
+
+
+def count_tokens(text, model="text-embedding-3-small"):
+    '''
+    Counts tokens with tiktoken when it is installed. Without it we fall back to the usual
+    "about 4 characters per token" estimate, which is close enough for sizing batches.
+    '''
+    if tiktoken is None:
+        return len(text) // 4 + 1
+
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return len(_encodings[model].encode(text, disallowed_special=()))
@@ -0,0 +1,207 @@
+'''
+Lightweight per-request timing. A page starts a Trace for each question; code anywhere below it
+wraps its stages in span("fetch"), span("embed"), ... and adds counts such as bytes fetched or
+tokens embedded. Spans with no active trace cost one ContextVar lookup and record nothing, so
+the same helpers can sit in ingestion code that runs outside any page.
+
+Finished traces go to a rotating JSONL log and to an in-memory rollup per page that the
+optional sidebar panel summarizes as p50/p95 per stage.
+'''
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+import numpy as np
+
+from utils.kv_cache import CACHE_DIR
+from utils.tokens import count_tokens
+
+TRACE_LOG = os.environ.get("TRACE_LOG", os.path.join(CACHE_DIR, "traces.jsonl"))
+TRACE_LOG_BYTES = 5 * 1024 * 1024
+TRACE_LOG_BACKUPS = 3
+ROLLUP_WINDOW = 500
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    def __init__(self, page):
+        self.page = page
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans = {}
+        self.counts = {}
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def count(self, name, amount):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def stream(self, deltas, name="llm"):
+        '''
+        Passes a stream of text deltas through, recording `name` (the whole stream), its time to
+        first token as `name`_ttft, and output tokens.
+        '''
+        text = []
+        llm_start = time.perf_counter()
+        for delta in deltas:
+            if not text:
+                self.add(f"{name}_ttft", time.perf_counter() - llm_start)
+            text.append(delta)
+            yield delta
+        self.add(name, time.perf_counter() - llm_start)
+        self.count("output_tokens", count_tokens("".join(text)))
+
+    def finish(self):
+        self.add("total", time.perf_counter() - self._start)
+        _current.set(None)
+        return log_record(self.page, self.spans, self.counts, started=self.started)
+
+
+def log_record(page, spans, counts=None, started=None):
+    '''Adds a finished record to the page's rollup and the log; Trace.finish and one-off timings use it.'''
+    record = {
+        "page": page,
+        "time": started or time.time(),
+        "spans": {name: round(seconds, 4) for name, seconds in spans.items()},
+        "counts": dict(counts or {}),
+    }
+    get_rollup(page).add(record)
+    _write(record)
+    return record
+
+
+def start_trace(page):
+    trace = Trace(page)
+    _current.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextmanager
+def span(name):
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - start)
+
+
+def stream_span(name, deltas):
+    '''Trace.stream on the active trace, for code that makes several LLM calls per question.'''
+    trace = _current.get()
+    if trace is None:
+        return deltas
+    return trace.stream(deltas, name)
+
+
+def count(name, amount):
+    trace = _current.get()
+    if trace is not None:
+        trace.count(name, amount)
+
+
+def in_context(fn):
+    '''Wraps fn so it runs with the caller's trace when handed to another thread.'''
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+class Rollup:
+    def __init__(self, window=ROLLUP_WINDOW):
+        self._lock = threading.Lock()
+        self.records = deque(maxlen=window)
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self):
+        '''{span: {"count", "p50", "p95"}} over the recent traces, in seconds.'''
+        with self._lock:
+            records = list(self.records)
+        samples = {}
+        for record in records:
+            for name, seconds in record["spans"].items():
+                samples.setdefault(name, []).append(seconds)
+        return {
+            name: {
+                "count": len(values),
+                "p50": float(np.percentile(values, 50)),
+                "p95": float(np.percentile(values, 95)),
+            }
+            for name, values in samples.items()
+        }
+
+
+_rollups = {}
+_rollups_lock = threading.Lock()
+
+
+def get_rollup(page):
+    with _rollups_lock:
+        if page not in _rollups:
+            _rollups[page] = Rollup()
+        return _rollups[page]
+
+
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def _write(record):
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            os.makedirs(os.path.dirname(TRACE_LOG) or ".", exist_ok=True)
+            handler = RotatingFileHandler(TRACE_LOG, maxBytes=TRACE_LOG_BYTES, backupCount=TRACE_LOG_BACKUPS)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _logger = logging.getLogger("traces")
+            _logger.setLevel(logging.INFO)
+            _logger.propagate = False
+            _logger.addHandler(handler)
+    _logger.info(json.dumps(record))
+
+
+def show_timings(page, trace=None):
+    '''Optional sidebar panel: this question's stages, then p50/p95 per stage for the page.'''
+    import streamlit as st
+
+    if not st.sidebar.toggle("Show timings", key=f"{page}_show_timings"):
+        return
+    with st.sidebar.expander("Timings", expanded=True):
+        startup = get_rollup("startup").summary()
+        if startup:
+            st.caption("Server start")
+            st.write(", ".join(f"{name} {row['p50'] * 1000:.0f} ms" for name, row in startup.items()))
+        if trace is not None:
+            st.caption("This question")
+            st.write(", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in trace.spans.items()))
+            if trace.counts:
+                st.write(", ".join(f"{name} {amount}" for name, amount in trace.counts.items()))
+        rollup = get_rollup(page).summary()
+        if rollup:
+            st.caption(f"Last {ROLLUP_WINDOW} questions on this page")
+            st.table({
+                "stage": list(rollup),
+                "n": [row["count"] for row in rollup.values()],
+                "p50 ms": [round(row["p50"] * 1000) for row in rollup.values()],
+                "p95 ms": [round(row["p95"] * 1000) for row in rollup.values()],
+            })
@@ -0,0 +1,146 @@
+'''
+Startup warm-up. The first script run in the process starts one background thread that does
+what the first question would otherwise wait for: importing the SDKs and chromadb, creating
+the pooled API clients and opening a connection on each, opening (or, without a snapshot,
+syncing) the su_orgs index with its BM25 and NumPy files, and opening the on-disk caches.
+
+Each step is a span in a "startup" trace, so it lands in traces.jsonl and the Timings panel
+like any question. mark_first_page() logs the time from process start to the end of the first
+page run: cold start to the first interactive page.
+
+The thread holds off until that first page is done (or FIRST_PAGE_WAIT has passed), since
+imports hold the GIL and would otherwise slow the very render we are trying to speed up.
+'''
+import logging
+import os
+import threading
+import time
+
+from utils.tracing import log_record, span, start_trace
+
+logger = logging.getLogger(__name__)
+
+# Set APP_WARMUP=0 to leave everything to the first request, e.g. when measuring without it.
+WARMUP = os.environ.get("APP_WARMUP", "1") != "0"
+CONNECT_TIMEOUT = 5.0
+FIRST_PAGE_WAIT = 10.0
+
+
+def _process_start():
+    '''Wall-clock time this process started. Linux only; elsewhere, when this module was imported.'''
+    try:
+        with open("/proc/self/stat", "r") as f:
+            # Fields after the command name; starttime (field 22) is in clock ticks since boot.
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        age = time.clock_gettime(time.CLOCK_BOOTTIME) - ticks / os.sysconf("SC_CLK_TCK")
+        return time.time() - age
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.time()
+
+
+PROCESS_START = _process_start()
+
+_thread = None
+_first_page = threading.Event()
+_lock = threading.Lock()
+
+
+def _step(name, fn):
+    with span(name):
+        try:
+            fn()
+        except Exception as e:
+            # A missing key or index only means that part stays cold; the page reports it properly.
+            logger.warning("warm-up step %s failed: %s", name, e)
+
+
+def _import_heavy():
+    import anthropic  # noqa: F401
+    import bs4  # noqa: F401
+    import chromadb  # noqa: F401
+    import openai  # noqa: F401
+    import pypdf  # noqa: F401
+
+
+def _connect():
+    '''One cheap request per provider so a TLS connection is already sitting in each client's pool.'''
+    from utils.resources import get_anthropic_client, get_openai_client
+
+    for request in [
+        lambda: get_openai_client().with_options(max_retries=0, timeout=CONNECT_TIMEOUT).models.list(),
+        lambda: get_anthropic_client().with_options(max_retries=0, timeout=CONNECT_TIMEOUT).models.list(limit=1),
+    ]:
+        try:
+            request()
+        except Exception as e:
+            # Any HTTP response, even an error status, leaves the connection open.
+            logger.debug("warm-up request failed: %s", e)
+
+
+def _open_index():
+    from utils.resources import get_collection
+
+    get_collection()
+
+
+def _load_indexes():
+    from utils.bm25 import load_bm25
+    from utils.resources import VECTOR_BACKEND, active_db_path
+
+    db_path = active_db_path()
+    load_bm25(db_path)
+    if VECTOR_BACKEND == "numpy":
+        from utils.numpy_index import load_numpy_index
+
+        load_numpy_index(db_path)
+
+
+def _open_caches():
+    from utils.answer_cache import get_answer_cache
+    from utils.documents import get_document_cache
+    from utils.embeddings import get_embedding_cache
+    from utils.fetch import get_http_cache
+    from utils.summary_cache import get_summary_cache
+
+    get_embedding_cache()
+    get_answer_cache("hw4")
+    get_answer_cache("hw5")
+    get_summary_cache()
+    get_http_cache()
+    get_document_cache()
+
+
+def warm_up():
+    _first_page.wait(FIRST_PAGE_WAIT)
+    trace = start_trace("startup")
+    _step("import", _import_heavy)
+    _step("connect", _connect)
+    _step("open_index", _open_index)
+    _step("load_indexes", _load_indexes)
+    _step("caches", _open_caches)
+    trace.add("warm_ready", time.time() - PROCESS_START)
+    trace.finish()
+    logger.info("warm-up finished %.2fs after process start", time.time() - PROCESS_START)
+
+
+def start_warmup():
+    '''Starts the warm-up thread once per process; later calls (every rerun of every session) do nothing.'''
+    global _thread
+    if not WARMUP:
+        return None
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=warm_up, name="warmup", daemon=True)
+            _thread.start()
+        return _thread
+
+
+def mark_first_page():
+    '''Logs the process's cold start once: seconds from process start until a page finished its first run.'''
+    with _lock:
+        if _first_page.is_set():
+            return
+        _first_page.set()
+    seconds = time.time() - PROCESS_START
+    log_record("startup", {"first_page": seconds})
+    logger.info("first page ready %.2fs after process start", seconds)